@@ -0,0 +1,67 @@
+"""Compare per-call Clarifai latency with a fresh channel per request versus the shared pooled client.
+
+Run with `invoke bench-clarifai-channel`; requires CLARIFAI_PAT in .streamlit/secrets.toml.
+Each call is a real (tiny) GPT-4 request, so keep the number of calls small.
+"""
+import argparse
+import statistics
+from time import perf_counter
+
+from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
+from clarifai_grpc.grpc.api import service_pb2, service_pb2_grpc
+
+from local_utils.settings import StreamlitAppSettings
+from local_utils.v2.clarifai_client import GPT4, ClarifaiClient, text_input
+
+PROMPT = "Reply with the single word: ok"
+
+
+def _per_call_channel(settings: StreamlitAppSettings) -> float:
+    start = perf_counter()
+    channel = ClarifaiChannel.get_grpc_channel()
+    stub = service_pb2_grpc.V2Stub(channel)
+    metadata = (("authorization", "Key " + settings.clarifai_pat.get_secret_value()),)
+    stub.PostModelOutputs(
+        service_pb2.PostModelOutputsRequest(
+            user_app_id=GPT4.user_app_id(), model_id=GPT4.model_id, inputs=[text_input(PROMPT)]
+        ),
+        metadata=metadata,
+    )
+    elapsed = perf_counter() - start
+    channel.close()
+    return elapsed
+
+
+def _pooled_channel(client: ClarifaiClient) -> float:
+    start = perf_counter()
+    client.post_model_outputs(GPT4, [text_input(PROMPT)])
+    return perf_counter() - start
+
+
+def _summarize(label: str, timings: list[float]) -> str:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))]
+    return (
+        f"{label:<12} n={len(timings):<3} mean={statistics.mean(timings):.3f}s "
+        f"median={statistics.median(timings):.3f}s p95={p95:.3f}s min={timings[0]:.3f}s"
+    )
+
+
+def main(num_calls: int):
+    settings = StreamlitAppSettings.load()
+    client = ClarifaiClient(pat=settings.clarifai_pat)
+    client.warm_up()
+
+    per_call = [_per_call_channel(settings) for _ in range(num_calls)]
+    pooled = [_pooled_channel(client) for _ in range(num_calls)]
+    client.close()
+
+    print(_summarize("per-call", per_call))
+    print(_summarize("pooled", pooled))
+    print(f"median saving per call: {statistics.median(per_call) - statistics.median(pooled):.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=5)
+    main(parser.parse_args().calls)
@@ -0,0 +1,178 @@
+"""Compare encode / decode throughput of the DynamoDB item codec against the resource-layer path it replaced.
+
+Run with `invoke bench-dynamodb-codec`; runs offline, nothing is sent to DynamoDB. The baseline functions
+reproduce the previous code: a JSON round trip to build items, gzip at its default level, a new
+TypeSerializer / TypeDeserializer per item, and Binary-wrapped values as returned by boto3's resource layer.
+"""
+import argparse
+import gzip
+import json
+from datetime import datetime
+from time import perf_counter
+from typing import Callable
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from local_utils.brainv2 import FEED_PARTITION, BlogEntry, DynamoDbMemoryEntries, PieceOfArt
+from local_utils.v2.thoughts import (
+    DynamoDbThoughtMemory,
+    PlanStep,
+    Thought,
+    ThoughtSummary,
+    encode_thought_delta,
+    thought_from_dynamodb_item,
+    thought_from_wire,
+)
+
+
+def _sample_thought() -> Thought:
+    now = datetime.utcnow()
+    return Thought(
+        thought_id="20231001120000abcdef",
+        version=9,
+        persona_name="Sample Persona",
+        initial_thought="I will write a blog post about the texture of early morning light.",
+        it_rationale="Mornings have been on my mind. " * 20,
+        plan=[PlanStep(tool_name="ReadJournal", purpose="Recall recent mornings " * 4) for _ in range(6)],
+        steps_completed=4,
+        context="Step output, summarized for the next step.\n---\n\n" * 150,
+        last_full_response="A long model response. " * 150,
+        generated_content_ids={f"PieceOfArt:2023100112000{x}abcde" for x in range(3)},
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def _sample_blog_entry() -> BlogEntry:
+    art = PieceOfArt(
+        persona_name="Sample Persona",
+        title="Morning Light",
+        art_descr="Soft light over a quiet street. " * 10,
+        date_added=datetime.utcnow(),
+        thought_id="20231001120000abcdef",
+    )
+    return BlogEntry(
+        persona_name="Sample Persona",
+        title="On Morning Light",
+        content="Paragraph of the blog post. " * 200,
+        date_added=datetime.utcnow(),
+        thought_id="20231001120000abcdef",
+        generated_art=[art],
+    )
+
+
+def _baseline_marshall(python_obj: dict) -> dict:
+    serializer = TypeSerializer()
+    return {k: serializer.serialize(v) for k, v in python_obj.items()}
+
+
+def _baseline_resource_item(wire_item: dict) -> dict:
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in wire_item.items()}
+
+
+def _baseline_thought_head(thought: Thought) -> dict:
+    return _baseline_marshall(
+        {
+            **json.loads(ThoughtSummary.from_thought(thought).model_dump_json(exclude_none=True)),
+            "pk": f"t|{thought.thought_id}",
+            "sk": "t|v0",
+            "version": thought.version,
+            "enc": "full",
+            "data": gzip.compress(thought.model_dump_json().encode()),
+            "gsi1pk": "t|COMPLETE" if thought.thought_complete else "t|INCOMPLETE",
+            "persona_name": thought.persona_name,
+        }
+    )
+
+
+def _baseline_thought_delta(thought: Thought) -> dict:
+    previous = thought.model_copy(update={"version": thought.version - 1, "context": thought.context[100:]})
+    delta = encode_thought_delta(json.loads(previous.model_dump_json()), json.loads(thought.model_dump_json()))
+    return _baseline_marshall(
+        {
+            "pk": f"t|{thought.thought_id}",
+            "sk": f"t|v{thought.version}",
+            "version": thought.version,
+            "enc": "delta",
+            "data": gzip.compress(json.dumps(delta).encode()),
+        }
+    )
+
+
+def _baseline_content_item(entry: BlogEntry) -> dict:
+    content_id = entry.get_content_id()
+    feed_key = entry.feed_key(content_id)
+    return _baseline_marshall(
+        {
+            "pk": f"aic|{content_id}",
+            "sk": entry.__class__.__name__,
+            "gsi1pk": f"{entry.__class__.__name__}#{entry.get_persona_slug()}",
+            "gsi3pk": FEED_PARTITION,
+            "gsi3sk": feed_key,
+            "gsi4pk": f"{FEED_PARTITION}|{entry.get_persona_slug()}",
+            "gsi4sk": feed_key,
+            "data": gzip.compress(entry.model_dump_json().encode()),
+        }
+    )
+
+
+def _baseline_content_from_item(wire_item: dict) -> BlogEntry:
+    item = _baseline_resource_item(wire_item)
+    return BlogEntry.model_validate_json(gzip.decompress(item["data"].value).decode())
+
+
+def _rate(func: Callable, arg, iterations: int) -> float:
+    func(arg)
+    start = perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return iterations / (perf_counter() - start)
+
+
+def main(iterations: int):
+    thought_memory = DynamoDbThoughtMemory(table_name="benchmark")
+    thought = _sample_thought()
+    entry = _sample_blog_entry()
+    previous = thought.model_copy(update={"version": thought.version - 1, "context": thought.context[100:]})
+    head_item = thought_memory._to_head_item(thought)
+    content_item = DynamoDbMemoryEntries._to_dynamodb_item(entry)
+
+    cases = [
+        (
+            "thought head encode",
+            (_baseline_thought_head, thought),
+            (thought_memory._to_head_item, thought),
+        ),
+        (
+            "thought head decode",
+            (lambda x: thought_from_dynamodb_item(_baseline_resource_item(x)), head_item),
+            (thought_from_wire, head_item),
+        ),
+        (
+            "thought delta encode",
+            (_baseline_thought_delta, thought),
+            (lambda x: thought_memory._to_dynamodb_item(x, previous=previous), thought),
+        ),
+        (
+            "blog entry encode",
+            (_baseline_content_item, entry),
+            (DynamoDbMemoryEntries._to_dynamodb_item, entry),
+        ),
+        (
+            "blog entry decode",
+            (_baseline_content_from_item, content_item),
+            (DynamoDbMemoryEntries._from_dynamodb_item, content_item),
+        ),
+    ]
+    print(f"{'case':<22} {'baseline/s':>12} {'codec/s':>12} {'speedup':>8}")
+    for label, (baseline, baseline_arg), (codec, codec_arg) in cases:
+        baseline_rate = _rate(baseline, baseline_arg, iterations)
+        codec_rate = _rate(codec, codec_arg, iterations)
+        print(f"{label:<22} {baseline_rate:>12,.0f} {codec_rate:>12,.0f} {codec_rate / baseline_rate:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    main(parser.parse_args().iterations)
@@ -1,31 +1,67 @@
-import gzip
+import asyncio
 import json
+import random
 from abc import ABC, abstractmethod
 from collections.abc import MutableMapping
 from dataclasses import dataclass, field
 from datetime import datetime
+from enum import Enum
+from functools import partial
 from hashlib import md5
+from io import BytesIO
 from logging import Logger
 from pathlib import Path
 from textwrap import dedent
-from typing import TYPE_CHECKING, Callable, Optional, Type, TypeVar
+from time import sleep
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Type, TypeVar
 
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
 from pydantic import BaseModel, TypeAdapter
 
-from .v2 import prompts
-from .v2.chat_completion import get_completion
+from .helpers import sortable_date
+from .v2 import model_metrics, prompts
+from .v2.art_cache import ArtContentsCache, load_art_cache, load_art_contents_cache
+from .v2.art_images import (
+    ART_CACHE_CONTROL,
+    DERIVATIVE_CONTENT_TYPE,
+    DERIVATIVE_MAX_EDGE,
+    ArtSize,
+    derivative_file_name,
+    image_content_type,
+    make_derivative,
+    make_derivatives,
+)
+from .v2.chat_completion import aget_completion, get_completion, get_completions, stream_completion
+from .v2.codec import CompressedModelCodec, condition_kwargs, marshall
 from .v2.image_gen import generate_image
+from .v2.model_backends import CompletionResult, run_async
+from .v2.pagination import INDEX_KEY_ATTRIBUTES, Page, QueryPaginator, decode_cursor, encode_cursor
 from .v2.personas import Persona, PersonaManager
-from .v2.thoughts import NewThoughtData, PlanStep, Thought, ThoughtMemory, UpdateThoughtData, marshall
+from .v2.render_queue import load_render_queue
+from .v2.sqlite_db import SqliteDatabase
+from .v2.thoughts import (
+    NewThoughtData,
+    PlanStep,
+    Thought,
+    ThoughtMemory,
+    UpdateThoughtData,
+)
 
 if TYPE_CHECKING:
     from mypy_boto3_dynamodb.client import DynamoDBClient
-    from mypy_boto3_dynamodb.service_resource import Table
     from mypy_boto3_s3.client import S3Client
 
 
+# deadline for retrying research questions a batched request failed to answer, one request per question
+RESEARCH_RETRY_TIMEOUT_SECONDS = 90.0
+# partition of the DynamoDB feed index, which holds every content item; each persona's feed is keyed under it
+FEED_PARTITION = "aic|feed"
+# a feed filtered by content type stops after this many queries and returns a short page with a cursor
+FEED_MAX_QUERIES_PER_PAGE = 5
+
+
 class BaseAiContent(BaseModel, ABC):
     persona_name: str
     date_added: datetime
@@ -76,13 +112,33 @@ class BaseAiContent(BaseModel, ABC):
     def get_file_name(self) -> str:
         return self.content_hash() + ".jpeg"
 
+    def feed_key(self, content_id: Optional[str] = None) -> str:
+        """Orders content of every type by when it was added; the range key of the DynamoDB feed index.
+
+        Pass `content_id` if it is already known, working it out hashes the whole content.
+        """
+        content_id = content_id or self.get_content_id()
+        return f"{sortable_date(self.date_added)}|{self.__class__.__name__}|{content_id}"
+
 
 _T = TypeVar("_T", bound=BaseAiContent)
 
 
+class RenderStatus(str, Enum):
+    Pending = "pending"
+    Complete = "complete"
+    Failed = "failed"
+
+
 class PieceOfArt(BaseAiContent):
     title: str
     art_descr: str
+    # art written before background rendering existed was always rendered first
+    render_status: RenderStatus = RenderStatus.Complete
+
+    @property
+    def is_rendered(self) -> bool:
+        return self.render_status == RenderStatus.Complete
 
     def format(self) -> str:
         return f"* **{self.title}**: {self.art_descr}"
@@ -128,6 +184,25 @@ class BlogEntry(BaseAiContent):
         return dedent(formatted).strip()
 
 
+AnyAiContent = SocialPost | JournalEntry | BlogEntry | PieceOfArt
+
+# content models by the type name used in typed content IDs ("PieceOfArt:<content id>") and item sort keys
+CONTENT_TYPES: dict[str, Type[AnyAiContent]] = {
+    cls.__name__: cls for cls in (SocialPost, JournalEntry, BlogEntry, PieceOfArt)
+}
+CONTENT_CODECS: dict[str, CompressedModelCodec] = {
+    name: CompressedModelCodec(cls) for name, cls in CONTENT_TYPES.items()
+}
+
+
+def split_typed_content_id(content_id_with_type: str) -> tuple[str, str]:
+    """("PieceOfArt", "<content id>") from "PieceOfArt:<content id>"."""
+    content_type, content_id = content_id_with_type.split(":")
+    if content_type not in CONTENT_TYPES:
+        raise ValueError(f"Unhandled match value {content_type=}")
+    return content_type, content_id
+
+
 class ArtworkDoesNotExist(RuntimeError):
     def __init__(self, msg):
         self.msg = msg
@@ -140,7 +215,7 @@ class AiContentNotFound(ValueError):
 
 @dataclass
 class OutputMemoryInterface(ABC):
-    def read_content_with_type(self, content_id_with_type: str) -> SocialPost | JournalEntry | BlogEntry | PieceOfArt:
+    def read_content_with_type(self, content_id_with_type: str) -> AnyAiContent:
         content_type, content_id = content_id_with_type.split(":")
         match content_type:
             case "SocialPost":
@@ -154,6 +229,10 @@ class OutputMemoryInterface(ABC):
             case _:
                 raise ValueError(f"Unhandled match value {content_type=}")
 
+    def read_contents_with_type(self, content_ids_with_type: list[str]) -> list[AnyAiContent]:
+        """read_content_with_type for every ID, in the order given; backends override this to batch the reads."""
+        return [self.read_content_with_type(x) for x in content_ids_with_type]
+
     def read_social_post(self, content_id: str) -> SocialPost:
         if not (ai_content := self.get_social_post(content_id)):
             raise AiContentNotFound(content_id, SocialPost)
@@ -201,7 +280,18 @@ class OutputMemoryInterface(ABC):
         pass
 
     @abstractmethod
-    def write_art_piece(self, persona_name: str, title: str, art_descr: str, thought_id: str) -> PieceOfArt:
+    def write_art_piece(
+        self,
+        persona_name: str,
+        title: str,
+        art_descr: str,
+        thought_id: str,
+        render_status: RenderStatus = RenderStatus.Complete,
+    ) -> PieceOfArt:
+        pass
+
+    @abstractmethod
+    def update_art_render_status(self, art: PieceOfArt, render_status: RenderStatus) -> PieceOfArt:
         pass
 
     @abstractmethod
@@ -213,9 +303,13 @@ class OutputMemoryInterface(ABC):
         pass
 
     @abstractmethod
-    def get_art_content_location(self, art: PieceOfArt) -> str:
+    def get_art_content_location(self, art: PieceOfArt, size: ArtSize = ArtSize.Original) -> str:
         pass
 
+    @abstractmethod
+    def backfill_art_derivatives(self, overwrite: bool = False) -> int:
+        """Create any missing resized derivatives for art stored before they existed; returns how many were written."""
+
     @abstractmethod
     def get_latest_art_pieces(self, persona_name: Optional[str] = None, num: int = 3) -> list[PieceOfArt]:
         pass
@@ -243,6 +337,19 @@ class OutputMemoryInterface(ABC):
     def get_latest_blog_entries(self, persona_name: Optional[str] = None, num: int = 3) -> list[BlogEntry]:
         pass
 
+    @abstractmethod
+    def get_feed(
+        self,
+        persona_name: Optional[str] = None,
+        types: Optional[Iterable[Type[BaseAiContent]]] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+    ) -> Page[AnyAiContent]:
+        """Content of every type (or only `types`), newest first; pass the page's cursor back for the next page.
+
+        A page filtered by `types` may hold fewer than `page_size` items while its cursor is not None.
+        """
+
     # @abstractmethod
     # def list_goals(self, include_completed=False) -> list[Goal]:
     #     pass
@@ -260,23 +367,48 @@ class OutputMemoryInterface(ABC):
 class LocalArtContents(OutputMemoryInterface, ABC):
     art_storage: Path
 
+    def _artwork_path(self, art: PieceOfArt, size: ArtSize = ArtSize.Original) -> Path:
+        if size == ArtSize.Original:
+            return self.art_storage / art.persona_name / art.get_file_name()
+        return self.art_storage / art.persona_name / size.value / derivative_file_name(art.get_file_name())
+
     def write_art_contents(self, art: PieceOfArt, contents: bytes):
-        artwork_path = self.art_storage / art.persona_name / art.get_file_name()
+        artwork_path = self._artwork_path(art)
         artwork_path.parent.mkdir(parents=True, exist_ok=True)
         if artwork_path.exists():
             raise RuntimeError("Artwork already exists")
+        # the original is written last, so stored art always has its derivatives
+        for size, derivative in make_derivatives(contents).items():
+            derivative_path = self._artwork_path(art, size)
+            derivative_path.parent.mkdir(parents=True, exist_ok=True)
+            derivative_path.write_bytes(derivative)
         artwork_path.write_bytes(contents)
 
     def read_art_contents(self, art: PieceOfArt) -> bytes:
-        artwork_path = self.art_storage / art.persona_name / art.get_file_name()
+        artwork_path = self._artwork_path(art)
         if not artwork_path.exists():
             raise ArtworkDoesNotExist("Artwork contents file does not exist")
         return artwork_path.read_bytes()
 
-    def get_art_content_location(self, art: PieceOfArt) -> str:
-        artwork_path = self.art_storage / art.persona_name / art.get_file_name()
+    def get_art_content_location(self, art: PieceOfArt, size: ArtSize = ArtSize.Original) -> str:
+        artwork_path = self._artwork_path(art, size)
+        if not artwork_path.exists():
+            # art stored before derivatives existed
+            artwork_path = self._artwork_path(art)
         return str(artwork_path.absolute())
 
+    def backfill_art_derivatives(self, overwrite: bool = False) -> int:
+        written = 0
+        for original in self.art_storage.glob("*/*.jpeg"):
+            for size in DERIVATIVE_MAX_EDGE:
+                derivative_path = original.parent / size.value / derivative_file_name(original.name)
+                if derivative_path.exists() and not overwrite:
+                    continue
+                derivative_path.parent.mkdir(parents=True, exist_ok=True)
+                derivative_path.write_bytes(make_derivative(original.read_bytes(), size))
+                written += 1
+        return written
+
 
 @dataclass
 class S3ArtContents(OutputMemoryInterface, ABC):
@@ -284,30 +416,166 @@ class S3ArtContents(OutputMemoryInterface, ABC):
     bucket_name: str
     web_url: str
     prefix: str = "images"
+    max_upload_concurrency: int = 8
 
     _s3_client: Optional["S3Client"] = field(default=None, init=False)
 
+    @property
+    def transfer_config(self) -> TransferConfig:
+        return TransferConfig(max_concurrency=self.max_upload_concurrency)
+
     @property
     def s3_client(self) -> "S3Client":
         if not self._s3_client:
             self._s3_client = boto3.client("s3")
         return self._s3_client
 
+    def _artwork_key(self, art: PieceOfArt, size: ArtSize = ArtSize.Original) -> str:
+        if size == ArtSize.Original:
+            return "/".join([self.prefix, art.get_persona_slug(), art.get_file_name()])
+        return "/".join([self.prefix, art.get_persona_slug(), size.value, derivative_file_name(art.get_file_name())])
+
     def write_art_contents(self, art: PieceOfArt, contents: bytes):
-        artwork_path = "/".join([self.prefix, art.get_persona_slug(), art.get_file_name()])
-        # raise RuntimeError("Artwork already exists")
-        self.s3_client.put_object(Body=contents, Bucket=self.bucket_name, Key=artwork_path)
+        derivatives = {
+            self._artwork_key(art, size): (derivative, DERIVATIVE_CONTENT_TYPE)
+            for size, derivative in make_derivatives(contents).items()
+        }
+        # the original is uploaded once every derivative is, so stored art always has its derivatives
+        self._upload(derivatives)
+        self._upload({self._artwork_key(art): (contents, image_content_type(contents))})
+
+    def _upload(self, uploads: dict[str, tuple[bytes, str]]):
+        with create_transfer_manager(self.s3_client, self.transfer_config) as manager:
+            futures = [
+                manager.upload(
+                    BytesIO(body),
+                    self.bucket_name,
+                    key,
+                    extra_args={"ContentType": content_type, "CacheControl": ART_CACHE_CONTROL},
+                )
+                for key, (body, content_type) in uploads.items()
+            ]
+            for future in futures:
+                future.result()
 
     def read_art_contents(self, art: PieceOfArt) -> bytes:
-        artwork_path = "/".join([self.prefix, art.get_persona_slug(), art.get_file_name()])
+        artwork_path = self._artwork_key(art)
         response = self.s3_client.get_object(Bucket=self.bucket_name, Key=artwork_path)
         # raise ArtworkDoesNotExist("Artwork contents file does not exist")
         byte_stream = response["Body"].read()
         return byte_stream
 
-    def get_art_content_location(self, art: PieceOfArt) -> str:
-        artwork_path = "/".join([self.prefix, art.get_persona_slug(), art.get_file_name()])
-        return f"{self.web_url}/{artwork_path}"
+    def get_art_content_location(self, art: PieceOfArt, size: ArtSize = ArtSize.Original) -> str:
+        # derivatives are not checked for, run `invoke backfill-art-derivatives` once for art stored before them
+        return f"{self.web_url}/{self._artwork_key(art, size)}"
+
+    def backfill_art_derivatives(self, overwrite: bool = False) -> int:
+        existing = set()
+        originals = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix + "/"):
+            for obj in page.get("Contents", []):
+                existing.add(obj["Key"])
+                # originals sit directly under the persona prefix: images/<persona>/<hash>.jpeg
+                if obj["Key"].endswith(".jpeg") and obj["Key"].count("/") == 2:
+                    originals.append(obj["Key"])
+
+        written = 0
+        for key in originals:
+            persona_prefix, file_name = key.rsplit("/", maxsplit=1)
+            todo = {
+                size: f"{persona_prefix}/{size.value}/{derivative_file_name(file_name)}" for size in DERIVATIVE_MAX_EDGE
+            }
+            todo = {size: dest for size, dest in todo.items() if overwrite or dest not in existing}
+            if not todo:
+                continue
+            contents = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+            for size, dest in todo.items():
+                self.s3_client.put_object(
+                    Body=make_derivative(contents, size),
+                    Bucket=self.bucket_name,
+                    Key=dest,
+                    ContentType=DERIVATIVE_CONTENT_TYPE,
+                    CacheControl=ART_CACHE_CONTROL,
+                )
+                written += 1
+        return written
+
+    def backfill_cache_headers(self, overwrite: bool = False) -> int:
+        """Set Content-Type and the immutable Cache-Control on stored art that lacks them; returns objects updated.
+
+        S3 metadata can only be changed by copying an object onto itself with replaced metadata.
+        """
+        to_update = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix + "/"):
+            for obj in page.get("Contents", []):
+                head = self.s3_client.head_object(Bucket=self.bucket_name, Key=obj["Key"])
+                if head.get("CacheControl") == ART_CACHE_CONTROL and head.get("ContentType", "").startswith("image/"):
+                    if not overwrite:
+                        continue
+                header = self.s3_client.get_object(Bucket=self.bucket_name, Key=obj["Key"], Range="bytes=0-11")
+                to_update.append((obj["Key"], image_content_type(header["Body"].read()), head.get("Metadata", {})))
+
+        with create_transfer_manager(self.s3_client, self.transfer_config) as manager:
+            futures = [
+                manager.copy(
+                    {"Bucket": self.bucket_name, "Key": key},
+                    self.bucket_name,
+                    key,
+                    extra_args={
+                        "MetadataDirective": "REPLACE",
+                        "ContentType": content_type,
+                        "CacheControl": ART_CACHE_CONTROL,
+                        "Metadata": metadata,
+                    },
+                )
+                for key, content_type, metadata in to_update
+            ]
+            for future in futures:
+                future.result()
+        return len(to_update)
+
+
+@dataclass
+class CachedArtReads(OutputMemoryInterface, ABC):
+    """Serves read_art_contents from the local art contents cache, in front of the art backend after it in the MRO.
+
+    e.g. MappingMemory(CachedArtReads, S3ArtContents, DynamoDbMemoryEntries)
+    """
+
+    _art_contents_cache: Optional[ArtContentsCache] = field(default=None, init=False)
+
+    @property
+    def art_contents_cache(self) -> ArtContentsCache:
+        if not self._art_contents_cache:
+            self._art_contents_cache = load_art_contents_cache()
+        return self._art_contents_cache
+
+    def write_art_contents(self, art: PieceOfArt, contents: bytes):
+        super().write_art_contents(art, contents)
+        self.art_contents_cache.set(art.content_hash(), contents)
+
+    def read_art_contents(self, art: PieceOfArt) -> bytes:
+        if (contents := self.art_contents_cache.get(art.content_hash())) is not None:
+            return contents
+        contents = super().read_art_contents(art)
+        self.art_contents_cache.set(art.content_hash(), contents, from_backend=True)
+        return contents
+
+
+# most keys a single BatchGetItem request may ask for
+BATCH_GET_MAX_KEYS = 100
+# requests made for one chunk of keys before giving up on the keys DynamoDB keeps leaving unprocessed
+BATCH_GET_MAX_ATTEMPTS = 8
+
+
+class BatchReadIncomplete(RuntimeError):
+    """Error raised when DynamoDB still leaves keys unprocessed after every retry."""
+
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
 
 
 @dataclass
@@ -315,7 +583,6 @@ class DynamoDbMemoryEntries(OutputMemoryInterface, ABC):
     table_name: str
     persona_manager: PersonaManager
     _dynamodb_client: Optional["DynamoDBClient"] = field(default=None, init=False)
-    _dynamodb_table: Optional["Table"] = field(default=None, init=False)
 
     @property
     def dynamodb_client(self) -> "DynamoDBClient":
@@ -323,79 +590,80 @@ class DynamoDbMemoryEntries(OutputMemoryInterface, ABC):
             self._dynamodb_client = boto3.client("dynamodb")
         return self._dynamodb_client
 
-    @property
-    def dynamodb_table(self) -> "Table":
-        if not self._dynamodb_table:
-            dynamodb = boto3.resource("dynamodb")
-            self._dynamodb_table = dynamodb.Table(self.table_name)
-        return self._dynamodb_table
-
-    def _query_to_thoughts(self, index: str, key_condition, limit: int = 25, ascending: bool = True) -> list[Thought]:
-        data = self.dynamodb_table.query(
-            IndexName=index, KeyConditionExpression=key_condition, Limit=limit, ScanIndexForward=ascending
-        )
-        ta = TypeAdapter(list[Thought])
-        return ta.validate_python(data["Items"])
-
-    def list_incomplete_thoughts(self) -> list[Thought]:
-        return self._query_to_thoughts(
-            index="gsi1", key_condition=Key("gsi1pk").eq("t|INCOMPLETE"), ascending=False, limit=100
-        )
-
-    def list_recently_completed_thoughts(self, num_results=5) -> list[Thought]:
-        return self._query_to_thoughts(
-            index="gsi1", key_condition=Key("gsi1pk").eq("t|COMPLETE"), ascending=False, limit=num_results
-        )
-
-    def list_recent_thoughts(self, num_results=5) -> list[Thought]:
-        return self._query_to_thoughts(
-            index="gsirev", key_condition=Key("sk").eq("t|v0"), ascending=False, limit=num_results
-        )
-
-    def _to_dynamodb_item(self, ai_content: _T) -> dict:
+    @staticmethod
+    def _to_dynamodb_item(ai_content: _T) -> dict:
         persona_name = ai_content.get_persona_slug()
         content_type = ai_content.__class__.__name__
+        content_id = ai_content.get_content_id()
+        feed_key = ai_content.feed_key(content_id)
+        return CONTENT_CODECS[content_type].encode(
+            ai_content,
+            {
+                "pk": f"aic|{content_id}",
+                "sk": content_type,
+                "gsi1pk": f"{content_type}#{persona_name}",
+                # every content type in one time ordered feed, and again in the persona's own feed
+                "gsi3pk": FEED_PARTITION,
+                "gsi3sk": feed_key,
+                "gsi4pk": f"{FEED_PARTITION}|{persona_name}",
+                "gsi4sk": feed_key,
+            },
+        )
 
-        output: bytes = gzip.compress(ai_content.model_dump_json().encode())
-        dynamodb_data = {
-            "pk": f"aic|{ai_content.get_content_id()}",
-            "sk": content_type,
-            "gsi1pk": f"{content_type}#{persona_name}",
-            "data": output,
-        }
-        return dynamodb_data
-
-    def _from_dynamodb_item(self, dynamodb_data: dict) -> _T:
-        content_type = dynamodb_data["sk"]
-        entry_data: str = gzip.decompress(dynamodb_data["data"].value).decode()
-        match content_type:
-            case "SocialPost":
-                model_cls = SocialPost
-            case "JournalEntry":
-                model_cls = JournalEntry
-            case "BlogEntry":
-                model_cls = BlogEntry
-            case "PieceOfArt":
-                model_cls = PieceOfArt
-            case _:
-                raise ValueError(f"Unhandled match value {content_type=}")
-        return model_cls.model_validate_json(entry_data)
+    @staticmethod
+    def _from_dynamodb_item(dynamodb_data: dict) -> _T:
+        content_type = dynamodb_data["sk"]["S"]
+        if content_type not in CONTENT_CODECS:
+            raise ValueError(f"Unhandled match value {content_type=}")
+        return CONTENT_CODECS[content_type].decode(dynamodb_data)
 
     def _save_new(self, ai_content: _T):
-        dynamodb_item = self._to_dynamodb_item(ai_content)
         self.dynamodb_client.put_item(
             TableName=self.table_name,
-            Item=marshall(dynamodb_item),
+            Item=self._to_dynamodb_item(ai_content),
             ConditionExpression="attribute_not_exists(pk) and attribute_not_exists(sk)",
         )
 
     def _get_by_content_id(self, content_id, model_class: Type[_T]) -> Optional[_T]:
-        response = self.dynamodb_table.get_item(Key={"pk": "aic|" + content_id, "sk": model_class.__name__})
+        response = self.dynamodb_client.get_item(
+            TableName=self.table_name, Key=marshall({"pk": "aic|" + content_id, "sk": model_class.__name__})
+        )
         item = response.get("Item")
         if not item:
             raise ValueError("No item found with the provided key.")
         return self._from_dynamodb_item(item)
 
+    def read_contents_with_type(self, content_ids_with_type: list[str]) -> list[AnyAiContent]:
+        """Every item in BatchGetItem requests of up to 100 keys, retrying unprocessed keys with backoff."""
+        keys = {x: split_typed_content_id(x) for x in content_ids_with_type}
+        unique_keys = list(dict.fromkeys(keys.values()))
+        found = {}
+        for start in range(0, len(unique_keys), BATCH_GET_MAX_KEYS):
+            chunk = unique_keys[start : start + BATCH_GET_MAX_KEYS]
+            request = {self.table_name: {"Keys": [marshall({"pk": f"aic|{cid}", "sk": ctype}) for ctype, cid in chunk]}}
+            for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+                if attempt:
+                    # full jitter exponential backoff, as for throttled model requests
+                    sleep(random.uniform(0, min(0.05 * 2**attempt, 2.0)))
+                response = self.dynamodb_client.batch_get_item(RequestItems=request)
+                for raw_item in response["Responses"].get(self.table_name, []):
+                    found[(raw_item["sk"]["S"], raw_item["pk"]["S"].removeprefix("aic|"))] = self._from_dynamodb_item(
+                        raw_item
+                    )
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+            else:
+                unprocessed = len(request[self.table_name]["Keys"])
+                raise BatchReadIncomplete(
+                    f"{unprocessed} content items still unprocessed after {BATCH_GET_MAX_ATTEMPTS} BatchGetItem requests"
+                )
+
+        for content_type, content_id in keys.values():
+            if (content_type, content_id) not in found:
+                raise AiContentNotFound(content_id, CONTENT_TYPES[content_type])
+        return [found[keys[x]] for x in content_ids_with_type]
+
     def _query_latest_creations(
         self, content_type: Type[_T], persona_name: Optional[str] = None, ascending=False, limit: int = 10
     ) -> list[_T]:
@@ -408,10 +676,80 @@ class DynamoDbMemoryEntries(OutputMemoryInterface, ABC):
             index = "gsirev"
             key_condition = Key("sk").eq(content_type.__name__)
 
-        data = self.dynamodb_table.query(
-            IndexName=index, KeyConditionExpression=key_condition, Limit=limit, ScanIndexForward=ascending
+        paginator = QueryPaginator(
+            query=self.dynamodb_client.query,
+            query_kwargs={
+                "TableName": self.table_name,
+                "IndexName": index,
+                "ScanIndexForward": ascending,
+                **condition_kwargs(key_condition),
+            },
+            decode=self._from_dynamodb_item,
+            key_attributes=INDEX_KEY_ATTRIBUTES[index],
+            page_size=min(limit, 500),
+            prefetch=limit > 500,
+            wire_format=True,
         )
-        return [self._from_dynamodb_item(x) for x in data["Items"]]
+        return list(paginator.items(limit))
+
+    def get_feed(
+        self,
+        persona_name: Optional[str] = None,
+        types: Optional[Iterable[Type[BaseAiContent]]] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+    ) -> Page[AnyAiContent]:
+        if persona_name:
+            persona_slug = self.persona_manager.get_persona_by_name(persona_name).get_persona_slug()
+            index = "gsi4"
+            key_condition = Key("gsi4pk").eq(f"{FEED_PARTITION}|{persona_slug}")
+        else:
+            index = "gsi3"
+            key_condition = Key("gsi3pk").eq(FEED_PARTITION)
+        filter_expression = Attr("sk").is_in([x.__name__ for x in types]) if types else None
+        paginator = QueryPaginator(
+            query=self.dynamodb_client.query,
+            query_kwargs={
+                "TableName": self.table_name,
+                "IndexName": index,
+                "ScanIndexForward": False,
+                **condition_kwargs(key_condition, filter_expression),
+            },
+            decode=self._from_dynamodb_item,
+            key_attributes=INDEX_KEY_ATTRIBUTES[index],
+            # Limit applies before the type filter, so filtered feeds read further per request, for a bounded
+            # number of requests
+            page_size=page_size if filter_expression is None else max(page_size, 100),
+            wire_format=True,
+        )
+        return paginator.take(page_size, cursor, max_requests=FEED_MAX_QUERIES_PER_PAGE)
+
+    def backfill_feed_index(self) -> int:
+        """Add the feed index attributes to content written before those indexes existed; returns items updated."""
+        updated = 0
+        for content_type in CONTENT_TYPES:
+            paginator = QueryPaginator(
+                query=self.dynamodb_client.query,
+                query_kwargs={
+                    "TableName": self.table_name,
+                    "IndexName": "gsirev",
+                    **condition_kwargs(Key("sk").eq(content_type)),
+                },
+                decode=lambda item: item,
+                key_attributes=INDEX_KEY_ATTRIBUTES["gsirev"],
+                page_size=500,
+                wire_format=True,
+            )
+            for item in paginator.items():
+                if "gsi3pk" in item and "gsi4pk" in item:
+                    continue
+                self.dynamodb_client.put_item(
+                    TableName=self.table_name,
+                    Item=self._to_dynamodb_item(self._from_dynamodb_item(item)),
+                    ConditionExpression="attribute_exists(pk)",
+                )
+                updated += 1
+        return updated
 
     ###### Abstract Methods Follow
     def get_social_post(self, content_id: str) -> Optional[SocialPost]:
@@ -442,17 +780,35 @@ class DynamoDbMemoryEntries(OutputMemoryInterface, ABC):
     def get_latest_social_posts(self, persona_name: Optional[str] = None, num: int = 5) -> list[SocialPost]:
         return self._query_latest_creations(SocialPost, persona_name, limit=num)
 
-    def write_art_piece(self, persona_name: str, title: str, art_descr: str, thought_id: str) -> PieceOfArt:
+    def write_art_piece(
+        self,
+        persona_name: str,
+        title: str,
+        art_descr: str,
+        thought_id: str,
+        render_status: RenderStatus = RenderStatus.Complete,
+    ) -> PieceOfArt:
         entry = PieceOfArt(
             persona_name=persona_name,
             title=title,
             art_descr=art_descr,
             date_added=datetime.utcnow(),
             thought_id=thought_id,
+            render_status=render_status,
         )
         self._save_new(entry)
         return entry
 
+    def update_art_render_status(self, art: PieceOfArt, render_status: RenderStatus) -> PieceOfArt:
+        # the render status is not part of the content hash, so the item keeps its key
+        updated = art.model_copy(update={"render_status": render_status})
+        self.dynamodb_client.put_item(
+            TableName=self.table_name,
+            Item=self._to_dynamodb_item(updated),
+            ConditionExpression="attribute_exists(pk)",
+        )
+        return updated
+
     def get_latest_art_pieces(self, persona_name: Optional[str] = None, num: int = 3) -> list[PieceOfArt]:
         return self._query_latest_creations(PieceOfArt, persona_name, limit=num)
 
@@ -489,6 +845,15 @@ class DynamoDbMemoryEntries(OutputMemoryInterface, ABC):
         return self._query_latest_creations(BlogEntry, persona_name, limit=num)
 
 
+# the LocalMemoryEntries storage key holding each content type
+LOCAL_MEMORY_KEYS = {
+    "SocialPost": "social_post_storage",
+    "JournalEntry": "journal",
+    "BlogEntry": "blog",
+    "PieceOfArt": "art_storage",
+}
+
+
 @dataclass
 class LocalMemoryEntries(OutputMemoryInterface, ABC):
     memory: MutableMapping[str, dict | list[dict]] = field(default_factory=dict)
@@ -497,6 +862,24 @@ class LocalMemoryEntries(OutputMemoryInterface, ABC):
         all_content = (model_class.model_validate(x) for x in self.memory.get(memory_key) or [])
         return next((x for x in all_content if x.get_content_id() == content_id), None)
 
+    def read_contents_with_type(self, content_ids_with_type: list[str]) -> list[AnyAiContent]:
+        """Indexes each requested type's storage by content ID in one pass, rather than scanning it per ID."""
+        keys = {x: split_typed_content_id(x) for x in content_ids_with_type}
+        found = {}
+        for content_type in {ctype for ctype, _ in keys.values()}:
+            wanted = {cid for ctype, cid in keys.values() if ctype == content_type}
+            model_class = CONTENT_TYPES[content_type]
+            for entry in self.memory.get(LOCAL_MEMORY_KEYS[content_type]) or []:
+                content = model_class.model_validate(entry)
+                if (content_id := content.get_content_id()) in wanted:
+                    found[(content_type, content_id)] = content
+                    wanted.discard(content_id)
+                    if not wanted:
+                        break
+            if wanted:
+                raise AiContentNotFound(wanted.pop(), model_class)
+        return [found[keys[x]] for x in content_ids_with_type]
+
     def get_social_post(self, content_id: str) -> Optional[SocialPost]:
         return self._find_by_content_id(content_id, "social_post_storage", SocialPost)
 
@@ -537,13 +920,21 @@ class LocalMemoryEntries(OutputMemoryInterface, ABC):
                 break
         return return_entries
 
-    def write_art_piece(self, persona_name: str, title: str, art_descr: str, thought_id: str) -> PieceOfArt:
+    def write_art_piece(
+        self,
+        persona_name: str,
+        title: str,
+        art_descr: str,
+        thought_id: str,
+        render_status: RenderStatus = RenderStatus.Complete,
+    ) -> PieceOfArt:
         entry = PieceOfArt(
             persona_name=persona_name,
             title=title,
             art_descr=art_descr,
             date_added=datetime.utcnow(),
             thought_id=thought_id,
+            render_status=render_status,
         )
         art_storage = self.memory.get("art_storage") or []
         art_storage.append(entry.model_dump())
@@ -551,6 +942,18 @@ class LocalMemoryEntries(OutputMemoryInterface, ABC):
 
         return entry
 
+    def update_art_render_status(self, art: PieceOfArt, render_status: RenderStatus) -> PieceOfArt:
+        updated = art.model_copy(update={"render_status": render_status})
+        art_storage = self.memory.get("art_storage") or []
+        for idx, entry in enumerate(art_storage):
+            if PieceOfArt.model_validate(entry).get_content_id() == art.get_content_id():
+                art_storage[idx] = updated.model_dump()
+                break
+        else:
+            raise AiContentNotFound(art.get_content_id(), PieceOfArt)
+        self.memory["art_storage"] = art_storage
+        return updated
+
     def get_latest_art_pieces(self, persona_name: Optional[str] = None, num: int = 5) -> list[PieceOfArt]:
         art_storage = self.memory.get("art_storage") or []
         return_entries = []
@@ -618,9 +1021,261 @@ class LocalMemoryEntries(OutputMemoryInterface, ABC):
                 break
         return return_entries
 
+    def get_feed(
+        self,
+        persona_name: Optional[str] = None,
+        types: Optional[Iterable[Type[BaseAiContent]]] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+    ) -> Page[AnyAiContent]:
+        after = decode_cursor(cursor)["feed_key"] if cursor else None
+        entries = []
+        for content_type in [x.__name__ for x in types] if types else CONTENT_TYPES:
+            model_class = CONTENT_TYPES[content_type]
+            for entry in self.memory.get(LOCAL_MEMORY_KEYS[content_type]) or []:
+                content = model_class.model_validate(entry)
+                if persona_name and content.persona_name != persona_name:
+                    continue
+                # each feed key hashes the content, so work it out once per entry
+                feed_key = content.feed_key()
+                if after and feed_key >= after:
+                    continue
+                entries.append((feed_key, content))
+        entries.sort(key=lambda x: x[0], reverse=True)
+        items = [content for _, content in entries[:page_size]]
+        next_cursor = encode_cursor({"feed_key": entries[page_size - 1][0]}) if len(entries) > page_size else None
+        return Page(items=items, cursor=next_cursor)
+
+
+OUTPUT_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS ai_content (content_id TEXT NOT NULL, content_type TEXT NOT NULL,"
+    " persona_name TEXT NOT NULL, date_added TEXT NOT NULL, data TEXT NOT NULL,"
+    " PRIMARY KEY (content_id, content_type)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS ai_content_by_type ON ai_content (content_type, date_added)",
+    "CREATE INDEX IF NOT EXISTS ai_content_by_persona ON ai_content (persona_name, content_type, date_added)",
+    "CREATE INDEX IF NOT EXISTS ai_content_feed ON ai_content (date_added, content_type, content_id)",
+    "CREATE INDEX IF NOT EXISTS ai_content_persona_feed"
+    " ON ai_content (persona_name, date_added, content_type, content_id)",
+)
+
+
+@dataclass
+class SqliteMemoryEntries(OutputMemoryInterface, ABC):
+    """Output entries in a local SQLite file; may share the file used by SqliteThoughtMemory."""
+
+    path: Path
+    _db: Optional[SqliteDatabase] = field(default=None, init=False)
+
+    @property
+    def db(self) -> SqliteDatabase:
+        if not self._db:
+            self._db = SqliteDatabase(path=self.path, schema=OUTPUT_SQLITE_SCHEMA)
+        return self._db
+
+    def _save_new(self, ai_content: _T):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO ai_content (content_id, content_type, persona_name, date_added, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    ai_content.get_content_id(),
+                    ai_content.__class__.__name__,
+                    ai_content.persona_name,
+                    sortable_date(ai_content.date_added),
+                    ai_content.model_dump_json(),
+                ),
+            )
+
+    def _get_by_content_id(self, content_id, model_class: Type[_T]) -> Optional[_T]:
+        row = (
+            self.db.connection()
+            .execute(
+                "SELECT data FROM ai_content WHERE content_id = ? AND content_type = ?",
+                (content_id, model_class.__name__),
+            )
+            .fetchone()
+        )
+        return model_class.model_validate_json(row[0]) if row else None
+
+    def read_contents_with_type(self, content_ids_with_type: list[str]) -> list[AnyAiContent]:
+        keys = {x: split_typed_content_id(x) for x in content_ids_with_type}
+        unique_keys = list(dict.fromkeys(keys.values()))
+        found = {}
+        # two parameters per key, kept under SQLite's default limit of 999
+        for start in range(0, len(unique_keys), 400):
+            chunk = unique_keys[start : start + 400]
+            rows = self.db.connection().execute(
+                "SELECT content_type, content_id, data FROM ai_content WHERE (content_type, content_id) IN"
+                f" (VALUES {', '.join(['(?, ?)'] * len(chunk))})",
+                [value for key in chunk for value in key],
+            )
+            for content_type, content_id, data in rows:
+                found[(content_type, content_id)] = CONTENT_TYPES[content_type].model_validate_json(data)
+
+        for content_type, content_id in keys.values():
+            if (content_type, content_id) not in found:
+                raise AiContentNotFound(content_id, CONTENT_TYPES[content_type])
+        return [found[keys[x]] for x in content_ids_with_type]
+
+    def _query_latest_creations(
+        self, content_type: Type[_T], persona_name: Optional[str] = None, ascending=False, limit: int = 10
+    ) -> list[_T]:
+        order = "ASC" if ascending else "DESC"
+        if persona_name:
+            rows = self.db.connection().execute(
+                "SELECT data FROM ai_content WHERE persona_name = ? AND content_type = ?"
+                f" ORDER BY date_added {order} LIMIT ?",
+                (persona_name, content_type.__name__, limit),
+            )
+        else:
+            rows = self.db.connection().execute(
+                f"SELECT data FROM ai_content WHERE content_type = ? ORDER BY date_added {order} LIMIT ?",
+                (content_type.__name__, limit),
+            )
+        return [content_type.model_validate_json(data) for (data,) in rows]
+
+    def get_feed(
+        self,
+        persona_name: Optional[str] = None,
+        types: Optional[Iterable[Type[BaseAiContent]]] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+    ) -> Page[AnyAiContent]:
+        conditions, params = [], []
+        if persona_name:
+            conditions.append("persona_name = ?")
+            params.append(persona_name)
+        if types:
+            type_names = [x.__name__ for x in types]
+            conditions.append(f"content_type IN ({', '.join(['?'] * len(type_names))})")
+            params.extend(type_names)
+        if cursor:
+            after = decode_cursor(cursor)
+            conditions.append("(date_added, content_type, content_id) < (?, ?, ?)")
+            params.extend([after["date_added"], after["content_type"], after["content_id"]])
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        # one extra row says whether there is another page
+        rows = (
+            self.db.connection()
+            .execute(
+                f"SELECT date_added, content_type, content_id, data FROM ai_content {where}"
+                "ORDER BY date_added DESC, content_type DESC, content_id DESC LIMIT ?",
+                (*params, page_size + 1),
+            )
+            .fetchall()
+        )
+        items = [CONTENT_TYPES[content_type].model_validate_json(data) for _, content_type, _, data in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            date_added, content_type, content_id, _ = rows[page_size - 1]
+            next_cursor = encode_cursor(
+                {"date_added": date_added, "content_type": content_type, "content_id": content_id}
+            )
+        return Page(items=items, cursor=next_cursor)
+
+    ###### Abstract Methods Follow
+    def get_social_post(self, content_id: str) -> Optional[SocialPost]:
+        return self._get_by_content_id(content_id, SocialPost)
+
+    def get_journal_entry(self, content_id: str) -> Optional[JournalEntry]:
+        return self._get_by_content_id(content_id, JournalEntry)
+
+    def get_blog_entry(self, content_id: str) -> Optional[BlogEntry]:
+        return self._get_by_content_id(content_id, BlogEntry)
+
+    def get_piece_of_art(self, content_id: str) -> Optional[PieceOfArt]:
+        return self._get_by_content_id(content_id, PieceOfArt)
+
+    def write_social_post(
+        self, persona_name: str, content: str, thought_id: str, art: Optional[PieceOfArt] = None
+    ) -> SocialPost:
+        entry = SocialPost(
+            persona_name=persona_name,
+            content=content,
+            generated_art=art,
+            date_added=datetime.utcnow(),
+            thought_id=thought_id,
+        )
+        self._save_new(entry)
+        return entry
+
+    def get_latest_social_posts(self, persona_name: Optional[str] = None, num: int = 5) -> list[SocialPost]:
+        return self._query_latest_creations(SocialPost, persona_name, limit=num)
+
+    def write_art_piece(
+        self,
+        persona_name: str,
+        title: str,
+        art_descr: str,
+        thought_id: str,
+        render_status: RenderStatus = RenderStatus.Complete,
+    ) -> PieceOfArt:
+        entry = PieceOfArt(
+            persona_name=persona_name,
+            title=title,
+            art_descr=art_descr,
+            date_added=datetime.utcnow(),
+            thought_id=thought_id,
+            render_status=render_status,
+        )
+        self._save_new(entry)
+        return entry
+
+    def update_art_render_status(self, art: PieceOfArt, render_status: RenderStatus) -> PieceOfArt:
+        # the render status is not part of the content hash, so the row keeps its key
+        updated = art.model_copy(update={"render_status": render_status})
+        with self.db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE ai_content SET data = ? WHERE content_id = ? AND content_type = ?",
+                (updated.model_dump_json(), art.get_content_id(), PieceOfArt.__name__),
+            )
+            if cursor.rowcount != 1:
+                raise AiContentNotFound(art.get_content_id(), PieceOfArt)
+        return updated
+
+    def get_latest_art_pieces(self, persona_name: Optional[str] = None, num: int = 3) -> list[PieceOfArt]:
+        return self._query_latest_creations(PieceOfArt, persona_name, limit=num)
+
+    def write_journal_entry(self, persona_name: str, content: str, thought_id: str) -> JournalEntry:
+        entry = JournalEntry(
+            persona_name=persona_name, content=content, date_added=datetime.utcnow(), thought_id=thought_id
+        )
+        self._save_new(entry)
+        return entry
+
+    def get_latest_journal_entries(self, persona_name: Optional[str] = None, num: int = 3) -> list[JournalEntry]:
+        return self._query_latest_creations(JournalEntry, persona_name, limit=num)
+
+    def write_blog_entry(
+        self,
+        persona_name: str,
+        title: str,
+        content: str,
+        thought_id: str,
+        linked_art: Optional[list[PieceOfArt]] = None,
+    ) -> BlogEntry:
+        entry = BlogEntry(
+            persona_name=persona_name,
+            title=title,
+            content=content,
+            date_added=datetime.utcnow(),
+            thought_id=thought_id,
+            generated_art=linked_art,
+        )
+        self._save_new(entry)
+        return entry
+
+    def get_latest_blog_entries(self, persona_name: Optional[str] = None, num: int = 3) -> list[BlogEntry]:
+        return self._query_latest_creations(BlogEntry, persona_name, limit=num)
+
+
+@dataclass()
+class MappingMemory(CachedArtReads, S3ArtContents, DynamoDbMemoryEntries):
+    pass
+
 
 @dataclass()
-class MappingMemory(S3ArtContents, DynamoDbMemoryEntries):
+class SqliteMemory(CachedArtReads, LocalArtContents, SqliteMemoryEntries):
     pass
 
 
@@ -629,6 +1284,17 @@ class ActionCallback(BaseModel):
     details: str
 
 
+class ActionDelta(BaseModel):
+    """Incremental model output for the step in progress, sent while a completion is streaming."""
+
+    status: str
+    delta: str
+
+
+# called by the action handlers as callback(status, details) or callback(status, delta=text)
+StepCallback = Callable[..., None]
+
+
 @dataclass
 class BrainInterface(ABC):
     logger: Logger
@@ -637,7 +1303,8 @@ class BrainInterface(ABC):
     personas: PersonaManager
 
     def start_new_thought(self, persona: Persona, user_nudge: Optional[str]) -> Thought:
-        new_thought, rationale = self._get_initial_thought_for_persona(persona, user_nudge)
+        with model_metrics.tool_context("NewThought"):
+            new_thought, rationale = self._get_initial_thought_for_persona(persona, user_nudge)
         new_thought_data = NewThoughtData(
             persona_name=persona.name, user_nudge=user_nudge, initial_thought=new_thought, it_rationale=rationale
         )
@@ -645,16 +1312,21 @@ class BrainInterface(ABC):
         return self.thought_memory.write_new_thought(new_thought_data)
 
     def develop_thought_plan(self, thought: Thought) -> Thought:
-        plan = self._get_plan_for_thought(thought)
+        with model_metrics.tool_context("PlanThought"):
+            plan = self._get_plan_for_thought(thought)
         return self.thought_memory.update_existing_thought(
             existing_thought=thought, update_thought_data=UpdateThoughtData(plan=plan)
         )
 
     def continue_thought(
-        self, thought: Thought, status_callback_fn: Callable[[ActionCallback], None] = None
+        self, thought: Thought, status_callback_fn: Callable[[ActionCallback | ActionDelta], None] = None
     ) -> tuple[Thought, str]:
-        def _status_callback_handler(status: str, details=""):
-            if status_callback_fn:
+        def _status_callback_handler(status: str, details="", delta=""):
+            if not status_callback_fn:
+                return
+            if delta:
+                status_callback_fn(ActionDelta(status=status, delta=delta))
+            else:
                 status_callback_fn(ActionCallback.model_validate({"status": status, "details": details}))
 
         current_step = thought.steps_completed + 1
@@ -663,33 +1335,36 @@ class BrainInterface(ABC):
         thought_update = UpdateThoughtData()
         linked_items_set = set(thought.generated_content_ids)
         new_creation: Optional[JournalEntry, BlogEntry, SocialPost, PieceOfArt] = None
-        match step.tool_name:
-            case prompts.ToolNames.ReadLatestBlogs:
-                context, full_output = self._handle_read_latest_blogs_action(thought, step, _status_callback_handler)
-            case prompts.ToolNames.QueryForInfo:
-                context, full_output = self._handle_query_for_info_action(thought, step, _status_callback_handler)
-            case prompts.ToolNames.ReadFromJournal:
-                context, full_output = self._handle_read_latest_journal_entries_action(
-                    thought, step, _status_callback_handler
-                )
-            case prompts.ToolNames.WriteInJournal:
-                context, full_output, new_creation = self._handle_write_journal_entry_action(
-                    thought, step, _status_callback_handler
-                )
-            case prompts.ToolNames.CreateArt:
-                context, full_output, new_creation = self._handle_create_art_action(
-                    thought, step, _status_callback_handler
-                )
-            case prompts.ToolNames.WriteBlogPost:
-                context, full_output, new_creation = self._handle_write_blog_action(
-                    thought, step, _status_callback_handler
-                )
-            case prompts.ToolNames.PostOnSocial:
-                context, full_output, new_creation = self._handle_post_social_action(
-                    thought, step, _status_callback_handler
-                )
-            case _:
-                raise ValueError("Unhandled thought response")
+        with model_metrics.tool_context(step.tool_name):
+            match step.tool_name:
+                case prompts.ToolNames.ReadLatestBlogs:
+                    context, full_output = self._handle_read_latest_blogs_action(
+                        thought, step, _status_callback_handler
+                    )
+                case prompts.ToolNames.QueryForInfo:
+                    context, full_output = self._handle_query_for_info_action(thought, step, _status_callback_handler)
+                case prompts.ToolNames.ReadFromJournal:
+                    context, full_output = self._handle_read_latest_journal_entries_action(
+                        thought, step, _status_callback_handler
+                    )
+                case prompts.ToolNames.WriteInJournal:
+                    context, full_output, new_creation = self._handle_write_journal_entry_action(
+                        thought, step, _status_callback_handler
+                    )
+                case prompts.ToolNames.CreateArt:
+                    context, full_output, new_creation = self._handle_create_art_action(
+                        thought, step, _status_callback_handler
+                    )
+                case prompts.ToolNames.WriteBlogPost:
+                    context, full_output, new_creation = self._handle_write_blog_action(
+                        thought, step, _status_callback_handler
+                    )
+                case prompts.ToolNames.PostOnSocial:
+                    context, full_output, new_creation = self._handle_post_social_action(
+                        thought, step, _status_callback_handler
+                    )
+                case _:
+                    raise ValueError("Unhandled thought response")
 
         if new_creation:
             linked_items_set.add(new_creation.get_content_id(include_type_identifier=True))
@@ -708,49 +1383,141 @@ class BrainInterface(ABC):
 
     @abstractmethod
     def _handle_post_social_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, SocialPost]:
         pass
 
     @abstractmethod
     def _handle_write_blog_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, BlogEntry]:
         pass
 
     @abstractmethod
     def _handle_create_art_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, PieceOfArt]:
         pass
 
     @abstractmethod
     def _handle_write_journal_entry_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, JournalEntry]:
         pass
 
     @abstractmethod
     def _handle_read_latest_journal_entries_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         pass
 
     @abstractmethod
     def _handle_read_latest_blogs_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         pass
 
     @abstractmethod
     def _handle_query_for_info_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         pass
 
     @staticmethod
-    def _generate_response_to_questions(questions: str) -> str:
-        return get_completion(prompts.general_question_answer(questions))
+    def _stream_completion(prompt: str, callback: StepCallback, status: str) -> str:
+        """Get a completion while forwarding each streamed delta to the step callback; returns the full text."""
+        response = []
+        for delta in stream_completion(prompt):
+            response.append(delta)
+            callback(status, delta=delta)
+        return "".join(response)
+
+    def _render_art(self, art: PieceOfArt) -> PieceOfArt:
+        """Render and store the image for a pending piece of art, recording the outcome on the art itself."""
+        try:
+            image_bytes = generate_image(art.art_descr, use_cache=True)
+            self.output_memory.write_art_contents(art, image_bytes)
+        except Exception:
+            if not self._art_contents_stored(art):
+                self.output_memory.update_art_render_status(art, RenderStatus.Failed)
+                raise
+            # another render of the same piece stored its contents first
+            self.logger.warning(f"Contents of {art.title} were already stored")
+        return self.output_memory.update_art_render_status(art, RenderStatus.Complete)
+
+    def _art_contents_stored(self, art: PieceOfArt) -> bool:
+        try:
+            self.output_memory.read_art_contents(art)
+        except Exception:
+            return False
+        return True
+
+    def _wait_for_art(self, art: PieceOfArt, callback: StepCallback) -> PieceOfArt:
+        """Block until a background render of `art` has finished; returns the art with its final render status."""
+        if art.render_status != RenderStatus.Pending:
+            return art
+        callback(f"waiting for {art.title} to finish rendering", "")
+        future = load_render_queue().get(art.get_content_id(include_type_identifier=True))
+        if future is None:
+            # the render may have finished since `art` was read, in which case the queue has already dropped it
+            art = self.output_memory.read_piece_of_art(art.get_content_id())
+            if art.render_status != RenderStatus.Pending:
+                return art
+            # queued by a process that has since gone away; the render cache makes a finished render cheap to redo
+            self.logger.warning(f"No render in progress for pending art {art.title}, rendering now")
+            try:
+                return self._render_art(art)
+            except Exception:
+                self.logger.exception(f"Rendering {art.title} failed")
+        else:
+            try:
+                future.result()
+            except Exception:
+                self.logger.warning(f"Background render of {art.title} failed")
+        return self.output_memory.read_piece_of_art(art.get_content_id())
+
+    def _generate_response_to_questions(self, questions: list[str]) -> str:
+        # each question is answered separately, but all of them in a single batched request
+        results = get_completions([prompts.general_question_answer(x) for x in questions], use_cache=True)
+        failed = [idx for idx, result in enumerate(results) if not result.ok]
+        if failed:
+            self.logger.info(f"Retrying {len(failed)} unanswered research questions concurrently")
+            retried = run_async(self._aanswer_questions([questions[idx] for idx in failed]))
+            for idx, result in zip(failed, retried):
+                results[idx] = result
+        answers = []
+        for question, result in zip(questions, results):
+            if result.ok:
+                answers.append(result.text)
+            else:
+                self.logger.warning(f"Failed to answer research question {question!r}: {result.error}")
+        if not answers:
+            raise BadAiResponse("No research questions could be answered.")
+        return "\n\n".join(answers)
+
+    @staticmethod
+    async def _aanswer_questions(questions: list[str]) -> list[CompletionResult]:
+        """Answer each question in its own request, all at once; requests still running at the deadline are cancelled."""
+        tasks = [
+            asyncio.ensure_future(
+                aget_completion(prompts.general_question_answer(x), timeout=RESEARCH_RETRY_TIMEOUT_SECONDS)
+            )
+            for x in questions
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=RESEARCH_RETRY_TIMEOUT_SECONDS)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        for task in tasks:
+            if task in pending:
+                results.append(CompletionResult(error="Cancelled at the research retry deadline"))
+            elif task.exception():
+                results.append(CompletionResult(error=repr(task.exception())))
+            else:
+                results.append(CompletionResult(text=task.result()))
+        return results
 
     @abstractmethod
     def _get_initial_thought_for_persona(self, persona: Persona, user_nudge: Optional[str]) -> tuple[str, str]:
@@ -771,7 +1538,7 @@ class BadAiResponse(RuntimeError):
 @dataclass
 class BrainV2(BrainInterface):
     def _handle_post_social_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, SocialPost]:
         persona = self.personas.get_persona_by_name(thought.persona_name)
         callback("crafting social post contents", "")
@@ -788,6 +1555,9 @@ class BrainV2(BrainInterface):
 
         callback("crafting social post contents", "Post: " + social_post_data)
 
+        if generated_art:
+            generated_art = self._wait_for_art(generated_art, callback)
+
         social_post = self.output_memory.write_social_post(
             persona_name=persona.name, content=social_post_data, art=generated_art, thought_id=thought.thought_id
         )
@@ -803,7 +1573,7 @@ class BrainV2(BrainInterface):
         return context, social_post.format(), social_post
 
     def _handle_write_blog_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, BlogEntry]:
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
@@ -816,15 +1586,15 @@ class BrainV2(BrainInterface):
         generated_art = []
         if thought.generated_content_ids:
             art_ids = [x for x in thought.generated_content_ids if x.startswith(PieceOfArt.__name__)]
-            for art_id in art_ids:
-                generated_art.append(self.output_memory.read_content_with_type(art_id))
+            generated_art = self.output_memory.read_contents_with_type(art_ids)
 
         if generated_art:
             self.logger.info(f"Found {len(generated_art)} art pieces to use with blog")
         else:
             self.logger.debug("No art pieces found for use with blog")
         blog_entry_prompt = prompts.write_blog_entry(thought, persona, step, blog_title, generated_art)
-        blog_entry_content = get_completion(blog_entry_prompt)
+        blog_entry_content = self._stream_completion(blog_entry_prompt, callback, f'writing "{blog_title}"')
+        generated_art = [self._wait_for_art(x, callback) for x in generated_art]
 
         new_blog = self.output_memory.write_blog_entry(
             persona_name=persona.name,
@@ -845,34 +1615,46 @@ class BrainV2(BrainInterface):
         return context, new_blog.format(), new_blog
 
     def _handle_create_art_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, PieceOfArt]:
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
-        callback("crafting new piece of art", "")
-        artwork_prompt = prompts.create_artwork(thought, persona, step)
-        artwork_description = get_completion(artwork_prompt)
+        # the artwork prompt embeds the current time, so the description is cached per step rather than per prompt;
+        # a rerun after a failure later in this step then reuses it, and with it the cached render
+        art_cache = load_art_cache()
+        artwork_description = art_cache.get_description(thought.thought_id, thought.steps_completed)
+        if artwork_description:
+            callback("reusing art description from a previous attempt", "")
+        else:
+            callback("crafting new piece of art", "")
+            artwork_prompt = prompts.create_artwork(thought, persona, step)
+            artwork_description = get_completion(artwork_prompt)
+            art_cache.set_description(thought.thought_id, thought.steps_completed, artwork_description)
 
         callback("naming new artwork", artwork_description)
-
         title_prompt = prompts.title_artwork(thought, persona, step, artwork_description)
         artwork_title = get_completion(title_prompt).strip('"').strip()
 
-        callback(f"named: {artwork_title} - rendering image", artwork_title)
-
-        image_bytes = generate_image(artwork_description)
-
+        # the record is written right away and the image rendered in the background; later steps that
+        # publish the art wait for the render with _wait_for_art
         new_art = self.output_memory.write_art_piece(
-            persona_name=persona.name, title=artwork_title, art_descr=artwork_description, thought_id=thought.thought_id
+            persona_name=persona.name,
+            title=artwork_title,
+            art_descr=artwork_description,
+            thought_id=thought.thought_id,
+            render_status=RenderStatus.Pending,
+        )
+        load_render_queue().submit(
+            new_art.get_content_id(include_type_identifier=True), partial(self._render_art, new_art)
         )
+        callback(f"named: {artwork_title} - rendering image in the background", artwork_title)
+
         context = thought.context.strip()
 
         created_art = "**I created a new piece of art!**\n\n"
         created_art += f"* TITLE: {artwork_title}\n"
         created_art += f"* DESCRIPTION: {artwork_description}\n"
 
-        self.output_memory.write_art_contents(new_art, image_bytes)
-
         if context:
             context = f"{created_art}\n---\n\n{context}"
         else:
@@ -882,19 +1664,19 @@ class BrainV2(BrainInterface):
         return context, artwork_description, new_art
 
     def _handle_write_journal_entry_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str, JournalEntry]:
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
         journal_prompt = prompts.write_journal_entry(thought, persona, step)
-        journal_entry = get_completion(journal_prompt)
+        journal_entry = self._stream_completion(journal_prompt, callback, "writing journal entry")
         new_entry = self.output_memory.write_journal_entry(persona.name, journal_entry, thought_id=thought.thought_id)
 
         # journal entry replaces current context completely
         return journal_entry, journal_entry, new_entry
 
     def _handle_read_latest_journal_entries_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         latest_journal_entries = self.output_memory.get_latest_journal_entries(persona_name=thought.persona_name)
         if not latest_journal_entries:
@@ -905,11 +1687,11 @@ class BrainV2(BrainInterface):
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
         prompt = prompts.summarize_for_context(thought, persona, step, journal_contents)
-        response = get_completion(prompt)
+        response = get_completion(prompt, use_cache=True)
         return response, journal_contents
 
     def _handle_read_latest_blogs_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         latest_blog_entries = self.output_memory.get_latest_blog_entries(persona_name=thought.persona_name)
         if not latest_blog_entries:
@@ -920,13 +1702,13 @@ class BrainV2(BrainInterface):
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
         prompt = prompts.summarize_for_context(thought, persona, step, blog_contents)
-        response = get_completion(prompt)
+        response = get_completion(prompt, use_cache=True)
         # if not last_line.startswith("I will"):
         #     raise BadAiResponse("AI Response does not contain expected task statement.")
         return response, blog_contents
 
     def _handle_query_for_info_action(
-        self, thought: Thought, step: PlanStep, callback: Callable[[str, str], None]
+        self, thought: Thought, step: PlanStep, callback: StepCallback
     ) -> tuple[str, str]:
         persona = self.personas.get_persona_by_name(thought.persona_name)
 
@@ -936,12 +1718,12 @@ class BrainV2(BrainInterface):
         query_str = "\n".join(queries)
         callback("Generating mock research data via GPT-4", "## Questions generated\n\n" + query_str)
         # 2. have gpt-4 simulate responses to the queries -- later integrate search, user feedback, etc.
-        full_response = self._generate_response_to_questions(query_str)
+        full_response = self._generate_response_to_questions(queries)
         callback(f"Evaluating research as {thought.persona_name}", "## Resarch Data\n\n" + full_response)
 
         # 3. summarize for context
         summarize_prompt = prompts.summarize_for_context(thought, persona, step, full_response)
-        new_context = get_completion(summarize_prompt)
+        new_context = get_completion(summarize_prompt, use_cache=True)
         return new_context, full_response
 
     def _generate_research_queries(self, thought: Thought, persona: Persona, step: PlanStep) -> list[str]:
@@ -960,9 +1742,7 @@ class BrainV2(BrainInterface):
 
     def _get_initial_thought_for_persona(self, persona: Persona, user_nudge: Optional[str]) -> tuple[str, str]:
         persona_name = persona.name
-        my_recent_thoughts = [
-            x for x in self.thought_memory.list_recently_completed_thoughts(10) if x.persona_name == persona_name
-        ]
+        my_recent_thoughts = self.thought_memory.list_recently_completed_thoughts(10, persona_name=persona_name)
 
         my_recent_actions = "\n".join(f"* {x.initial_thought}" for x in my_recent_thoughts)
         if not my_recent_actions:
@@ -6,3 +6,11 @@ from string import ascii_lowercase
 def date_id():
     now = datetime.utcnow()
     return now.strftime("%Y%m%d%H%M%S") + "".join(random.choices(ascii_lowercase, k=6))
+
+
+# fixed width, so dates compare correctly as strings even when the microseconds are zero
+SORTABLE_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def sortable_date(dt: datetime) -> str:
+    return dt.strftime(SORTABLE_DATE_FORMAT)
@@ -1,34 +1,135 @@
+import os
 from pathlib import Path
+from typing import Any, Callable, Literal, Optional
 
 import streamlit as st
-from pydantic import BaseModel, Field, SecretStr, field_validator
+from pydantic import BaseModel, Field, SecretStr, field_validator, model_validator
+
+
+def optional_setting(name: str, default: Any = None) -> Callable[[], Any]:
+    """Default factory for a setting that may be given as an environment variable or in the secrets file."""
+    return lambda: os.environ.get(name, st.secrets.get(name, default))
 
 
 class StreamlitAppSettings(BaseModel):
-    clarifai_pat: SecretStr = Field(default_factory=lambda: st.secrets["CLARIFAI_PAT"], validate_default=True)
-    openai_api_key: SecretStr = Field(default_factory=lambda: st.secrets["OPENAI_API_KEY"], validate_default=True)
+    # required unless inference_backend is "replay", which makes no model calls
+    clarifai_pat: Optional[SecretStr] = Field(default_factory=optional_setting("CLARIFAI_PAT"), validate_default=True)
+    openai_api_key: Optional[SecretStr] = Field(
+        default_factory=optional_setting("OPENAI_API_KEY"), validate_default=True
+    )
 
     app_data: Path = Field(default_factory=lambda: Path(st.secrets["APP_DATA"]))
     session_data: Path = Field(default_factory=lambda: Path(st.secrets["SESSION_DIR"]))
 
-    dynamodb_thoughts_table: str = Field(default_factory=lambda: st.secrets["DYNAMODB_THOUGHTS_TABLE"])
-    s3_data_bucket: str = Field(default_factory=lambda: st.secrets["S3_DATA_BUCKET"])
-    s3_web_address: str = Field(default_factory=lambda: st.secrets["S3_WEB_ADDRESS"])
+    # required unless memory_backend is "sqlite"
+    dynamodb_thoughts_table: Optional[str] = Field(default_factory=optional_setting("DYNAMODB_THOUGHTS_TABLE"))
+    s3_data_bucket: Optional[str] = Field(default_factory=optional_setting("S3_DATA_BUCKET"))
+    s3_web_address: Optional[str] = Field(default_factory=optional_setting("S3_WEB_ADDRESS"))
+
+    # "sqlite" keeps thoughts and output in one local SQLite file and art on local disk, instead of DynamoDB and S3
+    memory_backend: Literal["dynamodb", "sqlite"] = Field(
+        default_factory=optional_setting("MEMORY_BACKEND", "dynamodb"), validate_default=True
+    )
+    # defaults to APP_DATA/memory.sqlite3, with art stored under APP_DATA/art
+    sqlite_memory_path: Optional[Path] = Field(
+        default_factory=optional_setting("SQLITE_MEMORY_PATH"), validate_default=True
+    )
+
+    completion_cache_size_limit: int = 256 * 1024 * 1024
+    completion_cache_ttl_seconds: int = 7 * 24 * 60 * 60
+    art_cache_size_limit: int = 1024 * 1024 * 1024
+    # local copies of stored art read back from the art backend
+    art_contents_cache_size_limit: int = 2 * 1024 * 1024 * 1024
+    art_contents_hot_set_bytes: int = 64 * 1024 * 1024
+
+    # how long a cached thought head (t|v0) may be served before it is read again
+    thought_head_cache_ttl_seconds: float = 5.0
+
+    # per-attempt gRPC deadlines and retry budget for Clarifai model requests
+    text_request_timeout_seconds: float = Field(
+        default_factory=optional_setting("TEXT_REQUEST_TIMEOUT_SECONDS", 120.0), validate_default=True
+    )
+    image_request_timeout_seconds: float = Field(
+        default_factory=optional_setting("IMAGE_REQUEST_TIMEOUT_SECONDS", 180.0), validate_default=True
+    )
+    clarifai_max_attempts: int = Field(
+        default_factory=optional_setting("CLARIFAI_MAX_ATTEMPTS", 3), validate_default=True
+    )
+    # send a duplicate text request once the observed p95 latency is exceeded
+    hedge_text_requests: bool = Field(
+        default_factory=optional_setting("HEDGE_TEXT_REQUESTS", False), validate_default=True
+    )
+
+    # shared request budget for the Clarifai PAT; set governor_sqlite_path to share it between processes
+    text_requests_per_minute: float = Field(
+        default_factory=optional_setting("TEXT_REQUESTS_PER_MINUTE", 60), validate_default=True
+    )
+    text_max_in_flight: int = Field(default_factory=optional_setting("TEXT_MAX_IN_FLIGHT", 8), validate_default=True)
+    image_requests_per_minute: float = Field(
+        default_factory=optional_setting("IMAGE_REQUESTS_PER_MINUTE", 10), validate_default=True
+    )
+    image_max_in_flight: int = Field(default_factory=optional_setting("IMAGE_MAX_IN_FLIGHT", 2), validate_default=True)
+    governor_sqlite_path: Optional[Path] = Field(
+        default_factory=optional_setting("GOVERNOR_SQLITE_PATH"), validate_default=True
+    )
+
+    # "clarifai" calls the models; "record" also saves every call, "replay" serves saved calls offline
+    inference_backend: Literal["clarifai", "record", "replay"] = Field(
+        default_factory=optional_setting("INFERENCE_BACKEND", "clarifai"), validate_default=True
+    )
+    # defaults to APP_DATA/model-recordings
+    inference_recordings_dir: Optional[Path] = Field(
+        default_factory=optional_setting("INFERENCE_RECORDINGS_DIR"), validate_default=True
+    )
+    replay_simulate_latency: bool = Field(
+        default_factory=optional_setting("REPLAY_SIMULATE_LATENCY", True), validate_default=True
+    )
+    replay_on_miss: Literal["error", "cycle"] = Field(
+        default_factory=optional_setting("REPLAY_ON_MISS", "error"), validate_default=True
+    )
 
     @field_validator("clarifai_pat", mode="before")
     @classmethod
-    def clarifai_pat_is_secret(cls, v: str | SecretStr) -> SecretStr:
+    def clarifai_pat_is_secret(cls, v: Optional[str | SecretStr]) -> Optional[SecretStr]:
         if isinstance(v, str):
             return SecretStr(v)
         return v
 
     @field_validator("openai_api_key", mode="before")
     @classmethod
-    def key_is_secret(cls, v: str | SecretStr) -> SecretStr:
+    def key_is_secret(cls, v: Optional[str | SecretStr]) -> Optional[SecretStr]:
         if isinstance(v, str):
             return SecretStr(v)
         return v
 
+    @model_validator(mode="after")
+    def model_keys_unless_replaying(self) -> "StreamlitAppSettings":
+        if self.inference_backend != "replay":
+            missing = [
+                name
+                for name, value in (("CLARIFAI_PAT", self.clarifai_pat), ("OPENAI_API_KEY", self.openai_api_key))
+                if value is None
+            ]
+            if missing:
+                raise ValueError(f"{', '.join(missing)} required unless INFERENCE_BACKEND is replay")
+        return self
+
+    @model_validator(mode="after")
+    def aws_resources_unless_sqlite(self) -> "StreamlitAppSettings":
+        if self.memory_backend == "dynamodb":
+            missing = [
+                name
+                for name, value in (
+                    ("DYNAMODB_THOUGHTS_TABLE", self.dynamodb_thoughts_table),
+                    ("S3_DATA_BUCKET", self.s3_data_bucket),
+                    ("S3_WEB_ADDRESS", self.s3_web_address),
+                )
+                if value is None
+            ]
+            if missing:
+                raise ValueError(f"{', '.join(missing)} required unless MEMORY_BACKEND is sqlite")
+        return self
+
     @staticmethod
     @st.cache_resource
     def load():
@@ -1,39 +1,66 @@
 import json
 from datetime import timedelta
+from pathlib import Path
+from typing import Optional
 
 import streamlit as st
 from logzero import logger
 from pydantic import BaseModel, TypeAdapter
 from pydantic.v1 import BaseSettings
 
-from local_utils.brainv2 import BrainV2, MappingMemory, OutputMemoryInterface
+from local_utils.brainv2 import BrainV2, MappingMemory, OutputMemoryInterface, SqliteMemory
 from local_utils.session_data import BaseSessionData
 from local_utils.settings import StreamlitAppSettings
+from local_utils.v2.art_cache import load_art_contents_cache
+from local_utils.v2.governor import load_governor
+from local_utils.v2.model_metrics import load_model_metrics
 from local_utils.v2.personas import load_default_personas
-from local_utils.v2.thoughts import Thought, ThoughtMemory
+from local_utils.v2.thoughts import (
+    DynamoDbThoughtMemory,
+    SqliteThoughtMemory,
+    ThoughtMemory,
+    ThoughtReadCache,
+    ThoughtSummary,
+)
 
 
 def check_or_x(value: bool) -> str:
     return "✅" if value else "❌"
 
 
+def _sqlite_memory_path(settings: StreamlitAppSettings) -> Path:
+    return settings.sqlite_memory_path or settings.app_data / "memory.sqlite3"
+
+
 @st.cache_resource
 def setup_thought_memory() -> ThoughtMemory:
     settings = StreamlitAppSettings.load()
-    return ThoughtMemory(table_name=settings.dynamodb_thoughts_table)
+    read_cache = ThoughtReadCache(head_ttl_seconds=settings.thought_head_cache_ttl_seconds)
+    match settings.memory_backend:
+        case "dynamodb":
+            return DynamoDbThoughtMemory(table_name=settings.dynamodb_thoughts_table, read_cache=read_cache)
+        case "sqlite":
+            return SqliteThoughtMemory(path=_sqlite_memory_path(settings), read_cache=read_cache)
+        case _:
+            raise ValueError(f"Unhandled memory backend {settings.memory_backend=}")
 
 
 # @st.cache_resource
 def setup_output_memory() -> OutputMemoryInterface:
     settings = StreamlitAppSettings.load()
-    persona_manager = load_default_personas()
-    return MappingMemory(
-        table_name=settings.dynamodb_thoughts_table,
-        persona_manager=persona_manager,
-        bucket_name=settings.s3_data_bucket,
-        web_url=settings.s3_web_address,
-        prefix="images",
-    )
+    match settings.memory_backend:
+        case "dynamodb":
+            return MappingMemory(
+                table_name=settings.dynamodb_thoughts_table,
+                persona_manager=load_default_personas(),
+                bucket_name=settings.s3_data_bucket,
+                web_url=settings.s3_web_address,
+                prefix="images",
+            )
+        case "sqlite":
+            return SqliteMemory(path=_sqlite_memory_path(settings), art_storage=settings.app_data / "art")
+        case _:
+            raise ValueError(f"Unhandled memory backend {settings.memory_backend=}")
 
 
 def setup_brain() -> BrainV2:
@@ -46,26 +73,26 @@ def setup_brain() -> BrainV2:
 
 
 @st.cache_data(ttl=timedelta(seconds=5))
-def _list_recent_thoughts(num: int) -> list[dict]:
+def _list_recent_thoughts(num: int, persona_name: Optional[str]) -> list[dict]:
     logger.info("Getting recent thoughts from memory")
-    thoughts = setup_thought_memory().list_recently_completed_thoughts(num)
+    thoughts = setup_thought_memory().list_recently_completed_thought_summaries(num, persona_name=persona_name)
     return [x.model_dump() for x in thoughts]
 
 
-def list_recent_thoughts(num=25) -> list[Thought]:
-    ta = TypeAdapter(list[Thought])
-    return ta.validate_python(_list_recent_thoughts(num))
+def list_recent_thoughts(num=25, persona_name: Optional[str] = None) -> list[ThoughtSummary]:
+    ta = TypeAdapter(list[ThoughtSummary])
+    return ta.validate_python(_list_recent_thoughts(num, persona_name))
 
 
 @st.cache_data(ttl=timedelta(seconds=5))
 def _list_incomplete_thoughts() -> list[dict]:
     logger.info("Getting incomplete thoughts from memory")
-    thoughts = setup_thought_memory().list_incomplete_thoughts()
+    thoughts = setup_thought_memory().list_incomplete_thought_summaries()
     return [x.model_dump() for x in thoughts]
 
 
-def list_incomplete_thoughts() -> list[Thought]:
-    ta = TypeAdapter(list[Thought])
+def list_incomplete_thoughts() -> list[ThoughtSummary]:
+    ta = TypeAdapter(list[ThoughtSummary])
     return ta.validate_python(_list_incomplete_thoughts())
 
 
@@ -109,6 +136,24 @@ def render_tabbar():
 def render_debug_tab(session: BaseSessionData):
     with st.expander("Settings"):
         st.code(dump_model(StreamlitAppSettings.load()))
+    with st.expander("Model call metrics"):
+        metrics = load_model_metrics()
+        st.caption("Latency percentiles are bucket upper bounds; token counts are estimates")
+        st.dataframe(metrics.summary(), hide_index=True)
+        st.write("Most recent calls")
+        st.dataframe([vars(x) for x in metrics.recent()], hide_index=True)
+        st.write("Prompts trimmed to fit their token budget")
+        st.dataframe(
+            [{"summary": x.format(), "over_budget": x.over_budget} for x in metrics.trimmed_prompts()], hide_index=True
+        )
+    with st.expander("Art contents cache"):
+        stats = load_art_contents_cache().stats()
+        st.metric("Hit rate", f"{stats.hit_rate:.0%}")
+        st.dataframe([vars(stats)], hide_index=True)
+    with st.expander("Model request governor"):
+        st.dataframe(
+            [{"kind": kind, **vars(stats)} for kind, stats in load_governor().stats().items()], hide_index=True
+        )
     with st.expander("Session", expanded=True):
         st.button("Clear session data", on_click=session.clear_session)
         st.code(dump_model(session))
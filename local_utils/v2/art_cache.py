@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from hashlib import md5
+from pathlib import Path
+from typing import Optional
+
+import diskcache
+import streamlit as st
+
+from local_utils.settings import StreamlitAppSettings
+
+
+@dataclass
+class ArtRenderCache:
+    """Persistent cache of rendered images keyed by a hash of the art description, plus the description
+    generated for each CreateArt step, so a rerun after a failed step reuses both instead of paying again.
+
+    Once the cache grows past `size_limit` bytes the least recently used entries are evicted.
+    """
+
+    directory: Path
+    size_limit: int
+    description_ttl_seconds: int = 24 * 60 * 60
+    _cache: Optional[diskcache.Cache] = field(default=None, init=False)
+
+    @property
+    def cache(self) -> diskcache.Cache:
+        if self._cache is None:
+            self._cache = diskcache.Cache(
+                str(self.directory), size_limit=self.size_limit, eviction_policy="least-recently-used"
+            )
+        return self._cache
+
+    @staticmethod
+    def render_key(model_id: str, description: str) -> str:
+        return f"render|{model_id}|" + md5(description.encode()).hexdigest()
+
+    @staticmethod
+    def description_key(thought_id: str, step_num: int) -> str:
+        return f"descr|{thought_id}|{step_num}"
+
+    def get_render(self, model_id: str, description: str) -> Optional[bytes]:
+        return self.cache.get(self.render_key(model_id, description))
+
+    def set_render(self, model_id: str, description: str, image: bytes):
+        self.cache.set(self.render_key(model_id, description), image)
+
+    def get_description(self, thought_id: str, step_num: int) -> Optional[str]:
+        return self.cache.get(self.description_key(thought_id, step_num))
+
+    def set_description(self, thought_id: str, step_num: int, description: str):
+        self.cache.set(self.description_key(thought_id, step_num), description, expire=self.description_ttl_seconds)
+
+
+@dataclass
+class ArtContentsStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    memory_bytes: int = 0
+    disk_bytes: int = 0
+    backend_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        reads = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / reads if reads else 0.0
+
+
+@dataclass
+class ArtContentsCache:
+    """Local copy of stored art images, keyed by content hash: a size-bounded disk LRU with an in-memory hot set.
+
+    Stored art never changes once written, so entries are never invalidated, only evicted.
+    """
+
+    directory: Path
+    size_limit: int
+    hot_set_bytes: int
+    _disk: Optional[diskcache.Cache] = field(default=None, init=False)
+    _hot: OrderedDict[str, bytes] = field(default_factory=OrderedDict, init=False)
+    _hot_size: int = field(default=0, init=False)
+    _stats: ArtContentsStats = field(default_factory=ArtContentsStats, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    @property
+    def disk(self) -> diskcache.Cache:
+        if self._disk is None:
+            self._disk = diskcache.Cache(
+                str(self.directory), size_limit=self.size_limit, eviction_policy="least-recently-used"
+            )
+        return self._disk
+
+    def _remember(self, key: str, contents: bytes):
+        # caller holds the lock
+        if len(contents) > self.hot_set_bytes:
+            return
+        if key in self._hot:
+            self._hot_size -= len(self._hot.pop(key))
+        self._hot[key] = contents
+        self._hot_size += len(contents)
+        while self._hot_size > self.hot_set_bytes:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_size -= len(evicted)
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        with self._lock:
+            if (contents := self._hot.get(content_hash)) is not None:
+                self._hot.move_to_end(content_hash)
+                self._stats.memory_hits += 1
+                self._stats.memory_bytes += len(contents)
+                return contents
+        contents = self.disk.get(content_hash)
+        with self._lock:
+            if contents is None:
+                self._stats.misses += 1
+                return None
+            self._stats.disk_hits += 1
+            self._stats.disk_bytes += len(contents)
+            self._remember(content_hash, contents)
+        return contents
+
+    def set(self, content_hash: str, contents: bytes, from_backend: bool = False):
+        self.disk.set(content_hash, contents)
+        with self._lock:
+            if from_backend:
+                self._stats.backend_bytes += len(contents)
+            self._remember(content_hash, contents)
+
+    def stats(self) -> ArtContentsStats:
+        with self._lock:
+            return ArtContentsStats(**vars(self._stats))
+
+
+@st.cache_resource
+def load_art_contents_cache() -> ArtContentsCache:
+    settings = StreamlitAppSettings.load()
+    return ArtContentsCache(
+        directory=settings.app_data / "art-contents-cache",
+        size_limit=settings.art_contents_cache_size_limit,
+        hot_set_bytes=settings.art_contents_hot_set_bytes,
+    )
+
+
+@st.cache_resource
+def load_art_cache() -> ArtRenderCache:
+    settings = StreamlitAppSettings.load()
+    return ArtRenderCache(directory=settings.app_data / "art-render-cache", size_limit=settings.art_cache_size_limit)
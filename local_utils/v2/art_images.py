@@ -0,0 +1,55 @@
+from enum import Enum
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+
+class ArtSize(str, Enum):
+    Original = "original"
+    Medium = "medium"
+    Thumbnail = "thumbnail"
+
+
+# longest edge, in pixels, of each derivative; SDXL renders are 1024x1024
+DERIVATIVE_MAX_EDGE = {ArtSize.Medium: 768, ArtSize.Thumbnail: 256}
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+WEBP_QUALITY = 80
+
+# art is stored under its content hash, so a stored object never changes and can be cached forever
+ART_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def image_content_type(header: bytes, default: str = "image/jpeg") -> str:
+    """MIME type of an image from its leading bytes (the first 12 are enough)."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return default
+
+
+def derivative_file_name(original_file_name: str) -> str:
+    return Path(original_file_name).stem + ".webp"
+
+
+def make_derivative(contents: bytes, size: ArtSize) -> bytes:
+    max_edge = DERIVATIVE_MAX_EDGE[size]
+    with Image.open(BytesIO(contents)) as image:
+        resized = image.convert("RGB")
+        resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        output = BytesIO()
+        resized.save(output, format="WEBP", quality=WEBP_QUALITY)
+    return output.getvalue()
+
+
+def make_derivatives(contents: bytes) -> dict[ArtSize, bytes]:
+    """Resized WebP copies of a rendered image, one per derivative size."""
+    return {size: make_derivative(contents, size) for size in DERIVATIVE_MAX_EDGE}
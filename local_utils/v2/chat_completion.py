@@ -1,51 +1,85 @@
-from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
-from clarifai_grpc.grpc.api import resources_pb2, service_pb2, service_pb2_grpc
-from clarifai_grpc.grpc.api.status import status_code_pb2
+from time import perf_counter
+from typing import Iterator, Optional
+
 from logzero import logger
 
-from local_utils.settings import StreamlitAppSettings
+from local_utils.v2.clarifai_client import GPT4
+from local_utils.v2.completion_cache import load_completion_cache
+from local_utils.v2.model_backends import CompletionResult, load_backend
+from local_utils.v2.model_metrics import load_model_metrics
+
+
+def get_completion(prompt: str, use_cache: bool = False) -> str:
+    """Get a GPT-4 completion for the prompt.
+
+    With `use_cache`, a previous response to the identical prompt is returned from the persistent
+    completion cache instead of calling the model again; only enable this where a repeated answer is fine.
+    """
+    logger.info("Getting chat completion with GPT-4")
+    logger.debug("PROMPT")
+    logger.debug(prompt)
+
+    with load_model_metrics().measure(GPT4.model_id, len(prompt)) as measurement:
+        if use_cache:
+            cached = load_completion_cache().get(GPT4.model_id, prompt)
+            if cached is not None:
+                logger.info("Using cached chat completion")
+                measurement.status = "cached"
+                measurement.response_chars = len(cached)
+                return cached
 
+        response = load_backend().complete(prompt)
+        measurement.response_chars = len(response)
+    logger.debug("RESPONSE")
+    logger.debug(response)
+    if use_cache:
+        load_completion_cache().set(GPT4.model_id, prompt, response)
+    return response
 
-def get_completion(prompt: str) -> str:
-    # Your PAT (Personal Access Token) can be found in the portal under Authentification
-    settings = StreamlitAppSettings.load()
-    # Specify the correct user_id/app_id pairings
-    # Since you're making inferences outside your app's scope
-    USER_ID = "openai"
-    APP_ID = "chat-completion"
-    # Change these to whatever model and text URL you want to use
-    MODEL_ID = "GPT-4"
-    # MODEL_VERSION_ID = "ad16eda6ac054796bf9f348ab6733c72"
 
-    channel = ClarifaiChannel.get_grpc_channel()
-    stub = service_pb2_grpc.V2Stub(channel)
+def get_completions(prompts: list[str], use_cache: bool = False) -> list[CompletionResult]:
+    """Get GPT-4 completions for several prompts, packing them into as few PostModelOutputs calls as possible.
 
-    metadata = (("authorization", "Key " + settings.clarifai_pat.get_secret_value()),)
+    Results are returned in the same order as `prompts`. A failure of one prompt (or of a whole request)
+    is reported on the affected results rather than raised, so the caller decides what to do with partial output.
+    """
+    logger.info(f"Getting {len(prompts)} chat completions with GPT-4")
+    results: list[Optional[CompletionResult]] = [None] * len(prompts)
 
-    userDataObject = resources_pb2.UserAppIDSet(user_id=USER_ID, app_id=APP_ID)
+    pending: list[int] = []
+    for idx, prompt in enumerate(prompts):
+        if use_cache and (cached := load_completion_cache().get(GPT4.model_id, prompt)) is not None:
+            results[idx] = CompletionResult(text=cached)
+        else:
+            pending.append(idx)
 
-    logger.info("Getting chat completion with GPT-4")
+    if pending:
+        batch = [prompts[idx] for idx in pending]
+        with load_model_metrics().measure(GPT4.model_id, sum(map(len, batch)), len(batch)) as measurement:
+            batch_results = load_backend().complete_many(batch)
+            measurement.response_chars = sum(len(x.text) for x in batch_results if x.ok)
+            if not any(x.ok for x in batch_results):
+                measurement.status = "error"
+        for idx, result in zip(pending, batch_results):
+            results[idx] = result
+            if use_cache and result.ok:
+                load_completion_cache().set(GPT4.model_id, prompts[idx], result.text)
+
+    return results
+
+
+async def aget_completion(prompt: str, timeout: Optional[float] = None) -> str:
+    """Async get_completion; `timeout` is a per-call deadline in seconds, and cancelling the task cancels the RPC."""
+    logger.info("Getting chat completion with GPT-4 (async)")
     logger.debug("PROMPT")
     logger.debug(prompt)
 
-    post_model_outputs_response = stub.PostModelOutputs(
-        service_pb2.PostModelOutputsRequest(
-            user_app_id=userDataObject,
-            model_id=MODEL_ID,
-            # version_id=MODEL_VERSION_ID,  # This is optional. Defaults to the latest model version
-            inputs=[resources_pb2.Input(data=resources_pb2.Data(text=resources_pb2.Text(raw=prompt)))],
-        ),
-        metadata=metadata,
-    )
-    if post_model_outputs_response.status.code != status_code_pb2.SUCCESS:
-        print(post_model_outputs_response.status)
-        raise Exception(f"Post model outputs failed, status: {post_model_outputs_response.status.description}")
-
-    # Since we have one input, one output will exist here
-    output = post_model_outputs_response.outputs[0]
+    with load_model_metrics().measure(GPT4.model_id, len(prompt)) as measurement:
+        response = await load_backend().acomplete(prompt, timeout)
+        measurement.response_chars = len(response)
     logger.debug("RESPONSE")
-    logger.debug(output.data.text.raw)
-    return output.data.text.raw
+    logger.debug(response)
+    return response
 
 
 def get_completion_openai(prompt: str) -> str:
@@ -60,3 +94,22 @@ def get_completion_openai(prompt: str) -> str:
     logger.debug("RESPONSE")
     logger.debug(response)
     return response
+
+
+def stream_completion(prompt: str) -> Iterator[str]:
+    """Yield a GPT-4 completion incrementally, as text deltas, as soon as tokens are generated."""
+    logger.info("Streaming chat completion with GPT-4")
+    logger.debug("PROMPT")
+    logger.debug(prompt)
+
+    response = []
+    with load_model_metrics().measure(GPT4.model_id, len(prompt)) as measurement:
+        start = perf_counter()
+        for delta in load_backend().stream_completion(prompt):
+            if not response:
+                measurement.first_token_seconds = perf_counter() - start
+            response.append(delta)
+            measurement.response_chars += len(delta)
+            yield delta
+    logger.debug("RESPONSE")
+    logger.debug("".join(response))
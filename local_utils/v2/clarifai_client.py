@@ -0,0 +1,459 @@
+import asyncio
+import queue
+import random
+import threading
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter, sleep
+from typing import AsyncIterator, Iterator, Optional
+
+import grpc
+import streamlit as st
+from clarifai_grpc.channel import clarifai_channel
+from clarifai_grpc.grpc.api import resources_pb2, service_pb2, service_pb2_grpc
+from clarifai_grpc.grpc.api.status import status_code_pb2
+from logzero import logger
+from pydantic import SecretStr
+
+from local_utils.settings import StreamlitAppSettings
+from local_utils.v2.governor import ModelGovernor, load_governor
+from local_utils.v2.model_metrics import note_queue_time
+
+CLARIFAI_GRPC_BASE = "api.clarifai.com"
+# PostModelOutputs rejects requests with more inputs than this
+MAX_INPUTS_PER_REQUEST = 128
+
+# gRPC and Clarifai status codes that indicate a transient failure worth retrying
+RETRYABLE_GRPC_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+RETRYABLE_STATUS_CODES = {
+    status_code_pb2.CONN_THROTTLED,
+    status_code_pb2.MODEL_PREDICTION_FAILED,
+    status_code_pb2.MODEL_DEPLOYING,
+    status_code_pb2.RPC_REQUEST_QUEUE_FULL,
+    status_code_pb2.RPC_REQUEST_TIMEOUT,
+    status_code_pb2.RPC_SERVER_UNAVAILABLE,
+    status_code_pb2.INTERNAL_UNEXPECTED_TIMEOUT,
+}
+
+
+@dataclass(frozen=True)
+class ClarifaiModel:
+    # Specify the correct user_id/app_id pairings
+    # Since you're making inferences outside your app's scope
+    user_id: str
+    app_id: str
+    model_id: str
+    # "text" or "image"; selects the request policy used for the model
+    kind: str
+
+    def user_app_id(self) -> resources_pb2.UserAppIDSet:
+        return resources_pb2.UserAppIDSet(user_id=self.user_id, app_id=self.app_id)
+
+
+GPT4 = ClarifaiModel(user_id="openai", app_id="chat-completion", model_id="GPT-4", kind="text")
+SDXL = ClarifaiModel(user_id="stability-ai", app_id="stable-diffusion-2", model_id="stable-diffusion-xl", kind="image")
+
+
+@dataclass(frozen=True)
+class RequestPolicy:
+    """Deadline, retry and hedging behaviour for a model request.
+
+    `timeout` is the gRPC deadline for each attempt, in seconds. Failed attempts with a transient error
+    are retried up to `max_attempts` in total, sleeping a random "full jitter" delay of up to
+    `backoff_base * 2 ** (attempt - 1)` seconds (capped at `backoff_max`) in between.
+
+    With `hedge` enabled, once the model's observed p95 latency has passed without an answer, a duplicate
+    request is sent and whichever succeeds first is used; this needs `hedge_min_samples` recorded latencies.
+    """
+
+    timeout: Optional[float] = 120.0
+    max_attempts: int = 3
+    backoff_base: float = 1.0
+    backoff_max: float = 10.0
+    hedge: bool = False
+    hedge_min_samples: int = 20
+
+    def backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+
+class ModelOutputsFailed(RuntimeError):
+    """Error raised when Clarifai responds with a non-success status."""
+
+    def __init__(self, msg, code: int = status_code_pb2.FAILURE):
+        super().__init__(msg)
+        self.msg = msg
+        self.code = code
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    if isinstance(error, ModelOutputsFailed):
+        return error.code in RETRYABLE_STATUS_CODES
+    return False
+
+
+@dataclass
+class LatencyTracker:
+    """Rolling window of successful request latencies per model, used to decide when to hedge."""
+
+    window: int = 200
+    _samples: dict[str, deque] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def record(self, model_id: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model_id, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model_id: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model_id) or [])
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(pct * len(samples)))]
+
+
+def text_input(prompt: str, input_id: str = "") -> resources_pb2.Input:
+    return resources_pb2.Input(id=input_id, data=resources_pb2.Data(text=resources_pb2.Text(raw=prompt)))
+
+
+@dataclass
+class ClarifaiClient:
+    """Long-lived Clarifai connection, shared by every completion and image request in the process.
+
+    The channel is created lazily on first use and reused for all subsequent calls, so TLS and
+    HTTP/2 setup are only paid once; keepalive pings stop idle load balancers from silently dropping it
+    between thought steps.
+    """
+
+    pat: SecretStr
+    base: str = CLARIFAI_GRPC_BASE
+    keepalive_time_ms: int = 30_000
+    keepalive_timeout_ms: int = 10_000
+    # request policy per ClarifaiModel.kind
+    policies: dict[str, RequestPolicy] = field(default_factory=dict)
+    latencies: LatencyTracker = field(default_factory=LatencyTracker)
+    # shared rate / concurrency budget; every request attempt holds a slot for its model kind
+    governor: Optional[ModelGovernor] = None
+
+    _channel: Optional[grpc.Channel] = field(default=None, init=False)
+    _stub: Optional[service_pb2_grpc.V2Stub] = field(default=None, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    # grpc.aio channels are bound to the event loop that created them, so keep one per loop
+    _aio_stubs: weakref.WeakKeyDictionary = field(default_factory=weakref.WeakKeyDictionary, init=False)
+
+    def channel_options(self) -> list[tuple[str, str | int]]:
+        return [
+            ("grpc.service_config", clarifai_channel.grpc_json_config),
+            ("grpc.max_receive_message_length", clarifai_channel.MAX_MESSAGE_LENGTH),
+            ("grpc.keepalive_time_ms", self.keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", self.keepalive_timeout_ms),
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+
+    @staticmethod
+    def _prepare_stub_deserializer():
+        # the generated stubs read this module global when they are constructed;
+        # ClarifaiChannel.get_grpc_channel normally sets it, but we build our own channels
+        clarifai_channel.wrap_response_deserializer = clarifai_channel._response_deserializer_for_grpc
+
+    @property
+    def channel(self) -> grpc.Channel:
+        if not self._channel:
+            with self._lock:
+                if not self._channel:
+                    self._prepare_stub_deserializer()
+                    self._channel = grpc.secure_channel(
+                        self.base, grpc.ssl_channel_credentials(), options=self.channel_options()
+                    )
+        return self._channel
+
+    @property
+    def stub(self) -> service_pb2_grpc.V2Stub:
+        if not self._stub:
+            channel = self.channel
+            with self._lock:
+                if not self._stub:
+                    self._stub = service_pb2_grpc.V2Stub(channel)
+        return self._stub
+
+    @property
+    def metadata(self) -> tuple[tuple[str, str], ...]:
+        return (("authorization", "Key " + self.pat.get_secret_value()),)
+
+    def warm_up(self, timeout: float = 10.0) -> bool:
+        """Establish the connection ahead of the first request; returns False if it isn't ready in time."""
+        _ = self.stub
+        try:
+            grpc.channel_ready_future(self.channel).result(timeout=timeout)
+        except grpc.FutureTimeoutError:
+            logger.warning(f"Clarifai channel not ready after {timeout} seconds")
+            return False
+        return True
+
+    def aio_stub(self) -> service_pb2_grpc.V2Stub:
+        """Return a grpc.aio stub for the running event loop, creating its channel on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._aio_stubs:
+                self._prepare_stub_deserializer()
+                channel = grpc.aio.secure_channel(
+                    self.base, grpc.ssl_channel_credentials(), options=self.channel_options()
+                )
+                self._aio_stubs[loop] = (channel, service_pb2_grpc.V2Stub(channel))
+            return self._aio_stubs[loop][1]
+
+    @staticmethod
+    def _request(model: ClarifaiModel, inputs: list[resources_pb2.Input]) -> service_pb2.PostModelOutputsRequest:
+        return service_pb2.PostModelOutputsRequest(
+            user_app_id=model.user_app_id(),
+            model_id=model.model_id,
+            # version_id=MODEL_VERSION_ID,  # This is optional. Defaults to the latest model version
+            inputs=inputs,
+        )
+
+    def policy_for(self, model: ClarifaiModel) -> RequestPolicy:
+        return self.policies.get(model.kind) or RequestPolicy()
+
+    @staticmethod
+    def _check_response(post_model_outputs_response: service_pb2.MultiOutputResponse, allow_mixed_status=False):
+        code = post_model_outputs_response.status.code
+        if allow_mixed_status and code == status_code_pb2.MIXED_STATUS:
+            # some inputs failed; the caller inspects each output's own status
+            return
+        if code != status_code_pb2.SUCCESS:
+            logger.error(post_model_outputs_response.status)
+            raise ModelOutputsFailed(
+                f"Post model outputs failed, status: {post_model_outputs_response.status.description}", code=code
+            )
+
+    def post_model_outputs(
+        self,
+        model: ClarifaiModel,
+        inputs: list[resources_pb2.Input],
+        allow_mixed_status: bool = False,
+        policy: Optional[RequestPolicy] = None,
+    ) -> service_pb2.MultiOutputResponse:
+        """Call PostModelOutputs with the deadline, retries and hedging of `policy` (default: per model kind)."""
+        policy = policy or self.policy_for(model)
+        request = self._request(model, inputs)
+        for attempt in range(1, policy.max_attempts + 1):
+            try:
+                with self._governed(model.kind):
+                    start = perf_counter()
+                    post_model_outputs_response = self._post(model, request, policy, allow_mixed_status)
+                    self._check_response(post_model_outputs_response, allow_mixed_status)
+            except (grpc.RpcError, ModelOutputsFailed) as e:
+                if attempt == policy.max_attempts or not is_retryable(e):
+                    raise
+                delay = policy.backoff_delay(attempt)
+                logger.warning(f"{model.model_id} attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+                sleep(delay)
+                continue
+            self.latencies.record(model.model_id, perf_counter() - start)
+            return post_model_outputs_response
+
+    @contextmanager
+    def _governed(self, kind: str) -> Iterator[float]:
+        if not self.governor:
+            yield 0.0
+            return
+        with self.governor.slot(kind) as waited:
+            note_queue_time(waited)
+            yield waited
+
+    @asynccontextmanager
+    async def _agoverned(self, kind: str) -> AsyncIterator[float]:
+        if not self.governor:
+            yield 0.0
+            return
+        waited = await self.governor.aacquire(kind)
+        note_queue_time(waited)
+        try:
+            yield waited
+        finally:
+            self.governor.release(kind)
+
+    def _may_hedge(self, model: ClarifaiModel) -> bool:
+        # a hedged duplicate is optional work, so only send it if the governor has a slot free right now
+        if self.governor and not self.governor.try_acquire_now(model.kind):
+            logger.info(f"Not hedging {model.model_id} request; no request budget available")
+            return False
+        return True
+
+    def _release_hedge(self, model: ClarifaiModel):
+        if self.governor:
+            self.governor.release(model.kind)
+
+    def _hedge_after(self, model: ClarifaiModel, policy: RequestPolicy) -> Optional[float]:
+        if not policy.hedge:
+            return None
+        return self.latencies.percentile(model.model_id, 0.95, min_samples=policy.hedge_min_samples)
+
+    def _post(
+        self,
+        model: ClarifaiModel,
+        request: service_pb2.PostModelOutputsRequest,
+        policy: RequestPolicy,
+        allow_mixed_status: bool,
+    ) -> service_pb2.MultiOutputResponse:
+        hedge_after = self._hedge_after(model, policy)
+        if hedge_after is None:
+            return self.stub.PostModelOutputs(request, metadata=self.metadata, timeout=policy.timeout)
+
+        first = self.stub.PostModelOutputs.future(request, metadata=self.metadata, timeout=policy.timeout)
+        try:
+            return first.result(timeout=hedge_after)
+        except grpc.FutureTimeoutError:
+            pass
+        if not self._may_hedge(model):
+            return first.result()
+        try:
+            return self._hedge(model, request, policy, allow_mixed_status, first, hedge_after)
+        finally:
+            self._release_hedge(model)
+
+    def _hedge(
+        self,
+        model: ClarifaiModel,
+        request: service_pb2.PostModelOutputsRequest,
+        policy: RequestPolicy,
+        allow_mixed_status: bool,
+        first: grpc.Future,
+        hedge_after: float,
+    ) -> service_pb2.MultiOutputResponse:
+        logger.info(f"{model.model_id} request exceeded p95 latency of {hedge_after:.1f}s; sending hedged request")
+        second = self.stub.PostModelOutputs.future(request, metadata=self.metadata, timeout=policy.timeout)
+        finished: queue.Queue = queue.Queue()
+        first.add_done_callback(finished.put)
+        second.add_done_callback(finished.put)
+
+        last_error: Optional[Exception] = None
+        post_model_outputs_response = None
+        for _ in range(2):
+            future = finished.get()
+            try:
+                post_model_outputs_response = future.result()
+                self._check_response(post_model_outputs_response, allow_mixed_status)
+            except (grpc.RpcError, ModelOutputsFailed) as e:
+                last_error = e
+                continue
+            # first good answer wins; drop the other request
+            (second if future is first else first).cancel()
+            return post_model_outputs_response
+        if post_model_outputs_response is not None:
+            return post_model_outputs_response
+        raise last_error
+
+    async def apost_model_outputs(
+        self,
+        model: ClarifaiModel,
+        inputs: list[resources_pb2.Input],
+        timeout: Optional[float] = None,
+        policy: Optional[RequestPolicy] = None,
+    ) -> service_pb2.MultiOutputResponse:
+        """Async variant of post_model_outputs.
+
+        `timeout` overrides the policy's per-attempt gRPC deadline in seconds (DEADLINE_EXCEEDED is raised
+        as grpc.aio.AioRpcError); cancelling the awaiting task cancels the in-flight RPC.
+        """
+        policy = policy or self.policy_for(model)
+        timeout = timeout if timeout is not None else policy.timeout
+        request = self._request(model, inputs)
+        for attempt in range(1, policy.max_attempts + 1):
+            try:
+                async with self._agoverned(model.kind):
+                    start = perf_counter()
+                    post_model_outputs_response = await self._apost(model, request, policy, timeout)
+                    self._check_response(post_model_outputs_response)
+            except (grpc.RpcError, ModelOutputsFailed) as e:
+                if attempt == policy.max_attempts or not is_retryable(e):
+                    raise
+                delay = policy.backoff_delay(attempt)
+                logger.warning(f"{model.model_id} attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.latencies.record(model.model_id, perf_counter() - start)
+            return post_model_outputs_response
+
+    async def _apost(
+        self,
+        model: ClarifaiModel,
+        request: service_pb2.PostModelOutputsRequest,
+        policy: RequestPolicy,
+        timeout: Optional[float],
+    ) -> service_pb2.MultiOutputResponse:
+        stub = self.aio_stub()
+        hedge_after = self._hedge_after(model, policy)
+        if hedge_after is None:
+            return await stub.PostModelOutputs(request, metadata=self.metadata, timeout=timeout)
+
+        async def _call() -> service_pb2.MultiOutputResponse:
+            post_model_outputs_response = await stub.PostModelOutputs(request, metadata=self.metadata, timeout=timeout)
+            self._check_response(post_model_outputs_response)
+            return post_model_outputs_response
+
+        tasks = [asyncio.ensure_future(_call())]
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        hedged = not done and self._may_hedge(model)
+        if hedged:
+            logger.info(f"{model.model_id} request exceeded p95 latency of {hedge_after:.1f}s; sending hedged request")
+            tasks.append(asyncio.ensure_future(_call()))
+        try:
+            last_error: Optional[Exception] = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except (grpc.RpcError, ModelOutputsFailed) as e:
+                    last_error = e
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hedged:
+                self._release_hedge(model)
+
+    async def aclose_loop_channel(self):
+        """Close the grpc.aio channel belonging to the running event loop, if one was opened."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._aio_stubs.pop(loop, None)
+        if entry:
+            await entry[0].close()
+
+    def close(self):
+        with self._lock:
+            if self._channel:
+                self._channel.close()
+            self._channel = None
+            self._stub = None
+
+
+@st.cache_resource
+def load_client() -> ClarifaiClient:
+    settings = StreamlitAppSettings.load()
+    client = ClarifaiClient(
+        pat=settings.clarifai_pat,
+        policies={
+            "text": RequestPolicy(
+                timeout=settings.text_request_timeout_seconds,
+                max_attempts=settings.clarifai_max_attempts,
+                hedge=settings.hedge_text_requests,
+            ),
+            # renders are expensive, so never hedge them
+            "image": RequestPolicy(
+                timeout=settings.image_request_timeout_seconds, max_attempts=settings.clarifai_max_attempts
+            ),
+        },
+        governor=load_governor(),
+    )
+    client.warm_up()
+    return client
@@ -0,0 +1,109 @@
+"""Conversion between models and DynamoDB's low-level wire format ({"S": ...} attribute values).
+
+Items are read and written with the boto3 client rather than the resource layer, which builds new type
+(de)serializers and wraps binary values on every call.
+"""
+import gzip
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Generic, Optional, TypeVar
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from pydantic import BaseModel
+
+_M = TypeVar("_M", bound=BaseModel)
+
+# fallbacks for the attribute types the fast paths below do not handle (sets, floats, Binary, Decimal)
+_SERIALIZER = TypeSerializer()
+_DESERIALIZER = TypeDeserializer()
+
+# gzip's default of 9 is several times slower to write for a few percent smaller items; reads are unaffected
+COMPRESS_LEVEL = 6
+
+
+def to_wire(value) -> dict:
+    """One python value as a wire attribute value, the same as TypeSerializer.serialize."""
+    if isinstance(value, str):
+        return {"S": value}
+    # bool before int, since bool is a subclass of it
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, int):
+        return {"N": str(value)}
+    if isinstance(value, bytes):
+        return {"B": value}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, dict):
+        return {"M": {k: to_wire(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"L": [to_wire(v) for v in value]}
+    return _SERIALIZER.serialize(value)
+
+
+def from_wire(attribute: dict):
+    """One wire attribute value as a python value, the same as TypeDeserializer.deserialize."""
+    ((tag, value),) = attribute.items()
+    match tag:
+        case "S" | "BOOL":
+            return value
+        case "N":
+            return Decimal(value)
+        case "B":
+            # the client returns bytes, which TypeDeserializer would wrap in a Binary
+            return value
+        case "NULL":
+            return None
+        case "M":
+            return {k: from_wire(v) for k, v in value.items()}
+        case "L":
+            return [from_wire(v) for v in value]
+        case _:
+            return _DESERIALIZER.deserialize(attribute)
+
+
+def marshall(python_obj: dict) -> dict:
+    """Convert a standard dict into a DynamoDB item."""
+    return {k: to_wire(v) for k, v in python_obj.items()}
+
+
+def unmarshall(dynamo_obj: dict) -> dict:
+    """Convert a DynamoDB item into a standard dict; numbers are Decimals, as from the resource layer."""
+    return {k: from_wire(v) for k, v in dynamo_obj.items()}
+
+
+def condition_kwargs(key_condition: ConditionBase, filter_expression: Optional[ConditionBase] = None) -> dict:
+    """Client query arguments for boto3 Key / Attr conditions, which only the resource layer accepts as is."""
+    builder = ConditionExpressionBuilder()
+    built = builder.build_expression(key_condition, is_key_condition=True)
+    kwargs = {"KeyConditionExpression": built.condition_expression}
+    names = dict(built.attribute_name_placeholders)
+    values = dict(built.attribute_value_placeholders)
+    if filter_expression is not None:
+        built = builder.build_expression(filter_expression)
+        kwargs["FilterExpression"] = built.condition_expression
+        names.update(built.attribute_name_placeholders)
+        values.update(built.attribute_value_placeholders)
+    kwargs["ExpressionAttributeNames"] = names
+    kwargs["ExpressionAttributeValues"] = marshall(values)
+    return kwargs
+
+
+def compress_json(data: str) -> bytes:
+    return gzip.compress(data.encode(), compresslevel=COMPRESS_LEVEL)
+
+
+@dataclass(frozen=True)
+class CompressedModelCodec(Generic[_M]):
+    """Items holding a model as gzipped JSON in `data`, next to plain key and index attributes."""
+
+    model: type[_M]
+
+    def encode(self, obj: _M, attributes: dict) -> dict:
+        item = marshall(attributes)
+        item["data"] = {"B": compress_json(obj.model_dump_json())}
+        return item
+
+    def decode(self, item: dict) -> _M:
+        return self.model.model_validate_json(gzip.decompress(item["data"]["B"]))
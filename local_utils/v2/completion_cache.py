@@ -0,0 +1,51 @@
+from dataclasses import dataclass, field
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+import diskcache
+import streamlit as st
+
+from local_utils.settings import StreamlitAppSettings
+
+
+@dataclass
+class CompletionCache:
+    """Persistent prompt -> response cache, keyed by model ID plus a hash of the prompt.
+
+    Entries expire after `ttl_seconds`, and once the cache grows past `size_limit` bytes the least
+    recently used entries are evicted.
+    """
+
+    directory: Path
+    size_limit: int
+    ttl_seconds: int
+    _cache: Optional[diskcache.Cache] = field(default=None, init=False)
+
+    @property
+    def cache(self) -> diskcache.Cache:
+        if self._cache is None:
+            self._cache = diskcache.Cache(
+                str(self.directory), size_limit=self.size_limit, eviction_policy="least-recently-used"
+            )
+        return self._cache
+
+    @staticmethod
+    def cache_key(model_id: str, prompt: str) -> str:
+        return f"{model_id}|" + sha256(prompt.encode()).hexdigest()
+
+    def get(self, model_id: str, prompt: str) -> Optional[str]:
+        return self.cache.get(self.cache_key(model_id, prompt))
+
+    def set(self, model_id: str, prompt: str, response: str):
+        self.cache.set(self.cache_key(model_id, prompt), response, expire=self.ttl_seconds)
+
+
+@st.cache_resource
+def load_completion_cache() -> CompletionCache:
+    settings = StreamlitAppSettings.load()
+    return CompletionCache(
+        directory=settings.app_data / "completion-cache",
+        size_limit=settings.completion_cache_size_limit,
+        ttl_seconds=settings.completion_cache_ttl_seconds,
+    )
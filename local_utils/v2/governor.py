@@ -0,0 +1,282 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import monotonic, sleep, time
+from typing import Iterator
+
+import streamlit as st
+
+from local_utils.settings import StreamlitAppSettings
+
+
+@dataclass(frozen=True)
+class GovernorLimits:
+    """Request budget for one kind of model ("text" or "image").
+
+    Requests are admitted by a token bucket refilling at `requests_per_minute` and holding at most `burst`
+    tokens, and no more than `max_in_flight` requests of the kind may be outstanding at once.
+    """
+
+    requests_per_minute: float
+    burst: int
+    max_in_flight: int
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.requests_per_minute / 60
+
+
+@dataclass
+class GovernorStats:
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    in_flight: int = 0
+    acquired: int = 0
+    total_wait_seconds: float = 0.0
+
+
+class GovernorBackend(ABC):
+    """Storage for token buckets and in-flight counts; decides whether a request may start now."""
+
+    @abstractmethod
+    def try_acquire(self, kind: str, limits: GovernorLimits) -> tuple[bool, float]:
+        """Take a token and an in-flight slot if both are available.
+
+        Returns (acquired, seconds to wait before trying again).
+        """
+
+    @abstractmethod
+    def release(self, kind: str):
+        pass
+
+
+@dataclass
+class InProcessGovernorBackend(GovernorBackend):
+    poll_interval: float = 0.05
+    _tokens: dict[str, tuple[float, float]] = field(default_factory=dict, init=False)
+    _in_flight: dict[str, int] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def try_acquire(self, kind: str, limits: GovernorLimits) -> tuple[bool, float]:
+        now = monotonic()
+        with self._lock:
+            tokens, updated_at = self._tokens.get(kind, (float(limits.burst), now))
+            tokens = min(float(limits.burst), tokens + (now - updated_at) * limits.tokens_per_second)
+            self._tokens[kind] = (tokens, now)
+            if self._in_flight.get(kind, 0) >= limits.max_in_flight:
+                return False, self.poll_interval
+            if tokens < 1:
+                return False, (1 - tokens) / limits.tokens_per_second
+            self._tokens[kind] = (tokens - 1, now)
+            self._in_flight[kind] = self._in_flight.get(kind, 0) + 1
+            return True, 0.0
+
+    def release(self, kind: str):
+        with self._lock:
+            self._in_flight[kind] = max(0, self._in_flight.get(kind, 0) - 1)
+
+
+@dataclass
+class SqliteGovernorBackend(GovernorBackend):
+    """Budget shared by every process on the host that points at the same SQLite file.
+
+    Slots held by processes that have exited, or held longer than `stale_after_seconds`, are reclaimed.
+    """
+
+    path: Path
+    poll_interval: float = 0.1
+    stale_after_seconds: float = 600
+
+    def __post_init__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS governor_buckets"
+                " (kind TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS governor_slots"
+                " (slot_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, pid INTEGER NOT NULL,"
+                " acquired_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _reclaim_slots(self, conn: sqlite3.Connection, kind: str, now: float):
+        conn.execute(
+            "DELETE FROM governor_slots WHERE kind = ? AND acquired_at < ?", (kind, now - self.stale_after_seconds)
+        )
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM governor_slots WHERE kind = ?", (kind,)).fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute("DELETE FROM governor_slots WHERE kind = ? AND pid = ?", (kind, pid))
+            except PermissionError:
+                pass
+
+    def try_acquire(self, kind: str, limits: GovernorLimits) -> tuple[bool, float]:
+        now = time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT tokens, updated_at FROM governor_buckets WHERE kind = ?", (kind,)).fetchone()
+            tokens, updated_at = row if row else (float(limits.burst), now)
+            tokens = min(float(limits.burst), tokens + max(0.0, now - updated_at) * limits.tokens_per_second)
+
+            self._reclaim_slots(conn, kind, now)
+            (in_flight,) = conn.execute("SELECT count(*) FROM governor_slots WHERE kind = ?", (kind,)).fetchone()
+
+            acquired = in_flight < limits.max_in_flight and tokens >= 1
+            if acquired:
+                tokens -= 1
+                conn.execute(
+                    "INSERT INTO governor_slots (kind, pid, acquired_at) VALUES (?, ?, ?)", (kind, os.getpid(), now)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO governor_buckets (kind, tokens, updated_at) VALUES (?, ?, ?)",
+                (kind, tokens, now),
+            )
+        if acquired:
+            return True, 0.0
+        if in_flight >= limits.max_in_flight:
+            return False, self.poll_interval
+        return False, (1 - tokens) / limits.tokens_per_second
+
+    def release(self, kind: str):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM governor_slots WHERE slot_id ="
+                " (SELECT min(slot_id) FROM governor_slots WHERE kind = ? AND pid = ?)",
+                (kind, os.getpid()),
+            )
+
+
+@dataclass
+class ModelGovernor:
+    """Process-wide admission control for Clarifai requests, with separate limits per model kind."""
+
+    limits: dict[str, GovernorLimits]
+    backend: GovernorBackend = field(default_factory=InProcessGovernorBackend)
+    max_poll_interval: float = 1.0
+    _stats: dict[str, GovernorStats] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _stats_for(self, kind: str) -> GovernorStats:
+        return self._stats.setdefault(kind, GovernorStats())
+
+    def _enqueue(self, kind: str):
+        with self._lock:
+            stats = self._stats_for(kind)
+            stats.queue_depth += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+
+    def _dequeue(self, kind: str, acquired: bool, waited: float):
+        with self._lock:
+            stats = self._stats_for(kind)
+            stats.queue_depth -= 1
+            if acquired:
+                stats.in_flight += 1
+                stats.acquired += 1
+                stats.total_wait_seconds += waited
+
+    def try_acquire_now(self, kind: str) -> bool:
+        """Take a slot only if one is free right now; used for optional work such as hedged requests."""
+        if kind not in self.limits:
+            return True
+        acquired, _ = self.backend.try_acquire(kind, self.limits[kind])
+        if acquired:
+            with self._lock:
+                stats = self._stats_for(kind)
+                stats.in_flight += 1
+                stats.acquired += 1
+        return acquired
+
+    def acquire(self, kind: str) -> float:
+        """Block until a request of this kind may start; returns the seconds spent queued."""
+        if kind not in self.limits:
+            return 0.0
+        start = monotonic()
+        self._enqueue(kind)
+        acquired = False
+        try:
+            while True:
+                acquired, wait = self.backend.try_acquire(kind, self.limits[kind])
+                if acquired:
+                    return monotonic() - start
+                sleep(min(wait, self.max_poll_interval))
+        finally:
+            self._dequeue(kind, acquired, monotonic() - start)
+
+    async def aacquire(self, kind: str) -> float:
+        if kind not in self.limits:
+            return 0.0
+        start = monotonic()
+        self._enqueue(kind)
+        acquired = False
+        try:
+            while True:
+                acquired, wait = self.backend.try_acquire(kind, self.limits[kind])
+                if acquired:
+                    return monotonic() - start
+                await asyncio.sleep(min(wait, self.max_poll_interval))
+        finally:
+            self._dequeue(kind, acquired, monotonic() - start)
+
+    def release(self, kind: str):
+        if kind not in self.limits:
+            return
+        self.backend.release(kind)
+        with self._lock:
+            stats = self._stats_for(kind)
+            stats.in_flight = max(0, stats.in_flight - 1)
+
+    @contextmanager
+    def slot(self, kind: str) -> Iterator[float]:
+        """Hold a request slot for the duration of the block; yields the seconds spent queued."""
+        waited = self.acquire(kind)
+        try:
+            yield waited
+        finally:
+            self.release(kind)
+
+    def stats(self) -> dict[str, GovernorStats]:
+        with self._lock:
+            return {kind: GovernorStats(**vars(stats)) for kind, stats in self._stats.items()}
+
+
+@st.cache_resource
+def load_governor() -> ModelGovernor:
+    settings = StreamlitAppSettings.load()
+    if settings.governor_sqlite_path:
+        backend = SqliteGovernorBackend(path=settings.governor_sqlite_path)
+    else:
+        backend = InProcessGovernorBackend()
+    return ModelGovernor(
+        limits={
+            "text": GovernorLimits(
+                requests_per_minute=settings.text_requests_per_minute,
+                burst=settings.text_max_in_flight,
+                max_in_flight=settings.text_max_in_flight,
+            ),
+            "image": GovernorLimits(
+                requests_per_minute=settings.image_requests_per_minute,
+                burst=settings.image_max_in_flight,
+                max_in_flight=settings.image_max_in_flight,
+            ),
+        },
+        backend=backend,
+    )
@@ -1,57 +1,45 @@
-from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
-from clarifai_grpc.grpc.api import resources_pb2, service_pb2, service_pb2_grpc
-from clarifai_grpc.grpc.api.status import status_code_pb2
-from logzero import logger
-
-from local_utils.settings import StreamlitAppSettings
-
-
-def generate_image(prompt: str) -> bytes:
-    # Your PAT (Personal Access Token) can be found in the portal under Authentification
-    settings = StreamlitAppSettings.load()
-    # Specify the correct user_id/app_id pairings
-    # Since you're making inferences outside your app's scope
-    USER_ID = "stability-ai"
-    APP_ID = "stable-diffusion-2"
-    # Change these to whatever model and text URL you want to use
-    MODEL_ID = "stable-diffusion-xl"
+from typing import Optional
 
-    channel = ClarifaiChannel.get_grpc_channel()
-    stub = service_pb2_grpc.V2Stub(channel)
+from logzero import logger
 
-    metadata = (("authorization", "Key " + settings.clarifai_pat.get_secret_value()),)
+from local_utils.v2.art_cache import load_art_cache
+from local_utils.v2.clarifai_client import SDXL
+from local_utils.v2.model_backends import load_backend
+from local_utils.v2.model_metrics import load_model_metrics
 
-    userDataObject = resources_pb2.UserAppIDSet(user_id=USER_ID, app_id=APP_ID)
 
-    # To use a local text file, uncomment the following lines
-    # with open(TEXT_FILE_LOCATION, "rb") as f:
-    #    file_bytes = f.read()
+def generate_image(prompt: str, use_cache: bool = False) -> bytes:
+    """Render the prompt with stable-diffusion-xl.
 
+    With `use_cache`, a previous render of the identical prompt is returned from the persistent art render cache.
+    """
     logger.debug("GENERATING IMAGE")
     logger.debug(prompt)
+    with load_model_metrics().measure(SDXL.model_id, len(prompt)) as measurement:
+        if use_cache and (cached := load_art_cache().get_render(SDXL.model_id, prompt)) is not None:
+            logger.info("Using cached image render")
+            measurement.status = "cached"
+            measurement.response_chars = len(cached)
+            return cached
+        image = load_backend().generate_image(prompt)
+        measurement.response_chars = len(image)
+    if use_cache:
+        load_art_cache().set_render(SDXL.model_id, prompt, image)
+    return image
 
-    post_model_outputs_response = stub.PostModelOutputs(
-        service_pb2.PostModelOutputsRequest(
-            user_app_id=userDataObject,
-            model_id=MODEL_ID,
-            inputs=[
-                resources_pb2.Input(
-                    data=resources_pb2.Data(
-                        text=resources_pb2.Text(
-                            raw=prompt
-                            # url=TEXT_FILE_URL
-                            # raw=file_bytes
-                        )
-                    )
-                )
-            ],
-        ),
-        metadata=metadata,
-    )
-    if post_model_outputs_response.status.code != status_code_pb2.SUCCESS:
-        print(post_model_outputs_response.status)
-        raise Exception("Post model outputs failed, status: " + post_model_outputs_response.status.description)
 
-    # Since we have one input, one output will exist here
-    image = post_model_outputs_response.outputs[0].data.image.base64
+async def agenerate_image(prompt: str, timeout: Optional[float] = None, use_cache: bool = False) -> bytes:
+    """Async generate_image; `timeout` is a per-call deadline in seconds, and cancelling the task cancels the RPC."""
+    logger.debug("GENERATING IMAGE (async)")
+    logger.debug(prompt)
+    with load_model_metrics().measure(SDXL.model_id, len(prompt)) as measurement:
+        if use_cache and (cached := load_art_cache().get_render(SDXL.model_id, prompt)) is not None:
+            logger.info("Using cached image render")
+            measurement.status = "cached"
+            measurement.response_chars = len(cached)
+            return cached
+        image = await load_backend().agenerate_image(prompt, timeout)
+        measurement.response_chars = len(image)
+    if use_cache:
+        load_art_cache().set_render(SDXL.model_id, prompt, image)
     return image
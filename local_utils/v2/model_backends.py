@@ -0,0 +1,379 @@
+import asyncio
+import base64
+import itertools
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from time import perf_counter, sleep
+from typing import Any, Coroutine, Iterator, Literal, Optional, TypeVar
+
+import grpc
+import streamlit as st
+from clarifai_grpc.grpc.api.status import status_code_pb2
+from pydantic import BaseModel, ConfigDict
+
+from local_utils.settings import StreamlitAppSettings
+from local_utils.v2.clarifai_client import (
+    GPT4,
+    MAX_INPUTS_PER_REQUEST,
+    SDXL,
+    ModelOutputsFailed,
+    load_client,
+    text_input,
+)
+
+_R = TypeVar("_R")
+
+# prompts embed the current time ("Today's date is: ..."), which would otherwise make every recording unique
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d+)?")
+
+
+class CompletionResult(BaseModel):
+    """Outcome for one prompt of a get_completions batch; exactly one of text / error is set."""
+
+    text: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ModelBackend(ABC):
+    """Where model calls are actually served from; get_completion / generate_image and friends delegate here."""
+
+    @abstractmethod
+    def complete(self, prompt: str) -> str:
+        pass
+
+    @abstractmethod
+    def complete_many(self, prompts: list[str]) -> list[CompletionResult]:
+        pass
+
+    @abstractmethod
+    async def acomplete(self, prompt: str, timeout: Optional[float] = None) -> str:
+        pass
+
+    @abstractmethod
+    def stream_completion(self, prompt: str) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def generate_image(self, prompt: str) -> bytes:
+        pass
+
+    @abstractmethod
+    async def agenerate_image(self, prompt: str, timeout: Optional[float] = None) -> bytes:
+        pass
+
+    async def aclose_loop_resources(self):
+        """Release anything bound to the running event loop before it is closed."""
+
+
+class ClarifaiBackend(ModelBackend):
+    """Live backend: GPT-4 and stable-diffusion-xl via Clarifai, streaming via OpenAI."""
+
+    def complete(self, prompt: str) -> str:
+        post_model_outputs_response = load_client().post_model_outputs(GPT4, [text_input(prompt)])
+        # Since we have one input, one output will exist here
+        return post_model_outputs_response.outputs[0].data.text.raw
+
+    def complete_many(self, prompts: list[str]) -> list[CompletionResult]:
+        results: list[Optional[CompletionResult]] = [None] * len(prompts)
+        for start in range(0, len(prompts), MAX_INPUTS_PER_REQUEST):
+            chunk = list(range(start, min(len(prompts), start + MAX_INPUTS_PER_REQUEST)))
+            inputs = [text_input(prompts[idx], input_id=f"prompt-{idx}") for idx in chunk]
+            try:
+                response = load_client().post_model_outputs(GPT4, inputs, allow_mixed_status=True)
+            except ModelOutputsFailed as e:
+                for idx in chunk:
+                    results[idx] = CompletionResult(error=e.msg)
+                continue
+            except grpc.RpcError as e:
+                # still failing after the client's retries, e.g. DEADLINE_EXCEEDED or UNAVAILABLE
+                for idx in chunk:
+                    results[idx] = CompletionResult(error=f"{e.code().name}: {e.details()}")
+                continue
+
+            outputs_by_input_id = {output.input.id: output for output in response.outputs}
+            for position, idx in enumerate(chunk):
+                output = outputs_by_input_id.get(f"prompt-{idx}")
+                if output is None and position < len(response.outputs):
+                    output = response.outputs[position]
+                if output is None:
+                    results[idx] = CompletionResult(error="No output returned for input")
+                elif output.status.code != status_code_pb2.SUCCESS:
+                    results[idx] = CompletionResult(error=output.status.description or "Model output failed")
+                else:
+                    results[idx] = CompletionResult(text=output.data.text.raw)
+        return results
+
+    async def acomplete(self, prompt: str, timeout: Optional[float] = None) -> str:
+        post_model_outputs_response = await load_client().apost_model_outputs(
+            GPT4, [text_input(prompt)], timeout=timeout
+        )
+        return post_model_outputs_response.outputs[0].data.text.raw
+
+    def stream_completion(self, prompt: str) -> Iterator[str]:
+        # The Clarifai gRPC API has no server-streaming model output call, so streaming goes directly
+        # to OpenAI's GPT-4 chat completion endpoint.
+        import openai
+
+        settings = StreamlitAppSettings.load()
+        chunks = openai.ChatCompletion.create(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            api_key=settings.openai_api_key.get_secret_value(),
+            request_timeout=settings.text_request_timeout_seconds,
+        )
+        for chunk in chunks:
+            delta = chunk["choices"][0]["delta"].get("content")
+            if delta:
+                yield delta
+
+    def generate_image(self, prompt: str) -> bytes:
+        post_model_outputs_response = load_client().post_model_outputs(SDXL, [text_input(prompt)])
+        # Since we have one input, one output will exist here
+        return post_model_outputs_response.outputs[0].data.image.base64
+
+    async def agenerate_image(self, prompt: str, timeout: Optional[float] = None) -> bytes:
+        post_model_outputs_response = await load_client().apost_model_outputs(
+            SDXL, [text_input(prompt)], timeout=timeout
+        )
+        return post_model_outputs_response.outputs[0].data.image.base64
+
+    async def aclose_loop_resources(self):
+        await load_client().aclose_loop_channel()
+
+
+class Recording(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    kind: Literal["completion", "image"]
+    model_id: str
+    prompt: str
+    # completion text, or base64 encoded image bytes
+    response: str
+    latency_seconds: float
+    recorded_at: datetime
+
+    def image_bytes(self) -> bytes:
+        return base64.b64decode(self.response)
+
+
+class ReplayMiss(LookupError):
+    """Error raised when replaying a prompt that was never recorded."""
+
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
+
+
+@dataclass
+class RecordingStore:
+    """Directory of recorded model calls, one JSON file per normalized (kind, model, prompt)."""
+
+    directory: Path
+
+    @staticmethod
+    def recording_key(kind: str, model_id: str, prompt: str) -> str:
+        normalized = _TIMESTAMP_RE.sub("<timestamp>", prompt)
+        return f"{kind}-" + sha256(f"{model_id}\n{normalized}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def save(self, recording: Recording):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        key = self.recording_key(recording.kind, recording.model_id, recording.prompt)
+        self._path(key).write_text(recording.model_dump_json())
+
+    def load(self, kind: str, model_id: str, prompt: str) -> Optional[Recording]:
+        path = self._path(self.recording_key(kind, model_id, prompt))
+        if not path.exists():
+            return None
+        return Recording.model_validate_json(path.read_text())
+
+    def load_all(self, kind: str) -> list[Recording]:
+        return [Recording.model_validate_json(x.read_text()) for x in sorted(self.directory.glob(f"{kind}-*.json"))]
+
+
+@dataclass
+class RecordingBackend(ModelBackend):
+    """Serves calls from another backend and saves every prompt, response and measured latency."""
+
+    inner: ModelBackend
+    store: RecordingStore
+
+    def _record(self, kind: Literal["completion", "image"], model_id: str, prompt: str, response: str, latency: float):
+        self.store.save(
+            Recording(
+                kind=kind,
+                model_id=model_id,
+                prompt=prompt,
+                response=response,
+                latency_seconds=latency,
+                recorded_at=datetime.utcnow(),
+            )
+        )
+
+    def complete(self, prompt: str) -> str:
+        start = perf_counter()
+        response = self.inner.complete(prompt)
+        self._record("completion", GPT4.model_id, prompt, response, perf_counter() - start)
+        return response
+
+    def complete_many(self, prompts: list[str]) -> list[CompletionResult]:
+        start = perf_counter()
+        results = self.inner.complete_many(prompts)
+        latency = perf_counter() - start
+        for prompt, result in zip(prompts, results):
+            if result.ok:
+                self._record("completion", GPT4.model_id, prompt, result.text, latency)
+        return results
+
+    async def acomplete(self, prompt: str, timeout: Optional[float] = None) -> str:
+        start = perf_counter()
+        response = await self.inner.acomplete(prompt, timeout)
+        self._record("completion", GPT4.model_id, prompt, response, perf_counter() - start)
+        return response
+
+    def stream_completion(self, prompt: str) -> Iterator[str]:
+        start = perf_counter()
+        response = []
+        for delta in self.inner.stream_completion(prompt):
+            response.append(delta)
+            yield delta
+        self._record("completion", GPT4.model_id, prompt, "".join(response), perf_counter() - start)
+
+    def generate_image(self, prompt: str) -> bytes:
+        start = perf_counter()
+        image = self.inner.generate_image(prompt)
+        self._record("image", SDXL.model_id, prompt, base64.b64encode(image).decode(), perf_counter() - start)
+        return image
+
+    async def agenerate_image(self, prompt: str, timeout: Optional[float] = None) -> bytes:
+        start = perf_counter()
+        image = await self.inner.agenerate_image(prompt, timeout)
+        self._record("image", SDXL.model_id, prompt, base64.b64encode(image).decode(), perf_counter() - start)
+        return image
+
+    async def aclose_loop_resources(self):
+        await self.inner.aclose_loop_resources()
+
+
+@dataclass
+class ReplayBackend(ModelBackend):
+    """Serves recorded responses without any network access.
+
+    With `simulate_latency`, each call sleeps for the latency measured when it was recorded. A prompt
+    that was never recorded raises ReplayMiss, or with `on_miss="cycle"` gets the next recording of the
+    same kind in turn, which keeps load tests going when prompts drift from the recorded run.
+    """
+
+    store: RecordingStore
+    simulate_latency: bool = True
+    on_miss: Literal["error", "cycle"] = "error"
+    _cycles: dict[str, Iterator[Recording]] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _find(self, kind: Literal["completion", "image"], model_id: str, prompt: str) -> Recording:
+        recording = self.store.load(kind, model_id, prompt)
+        if recording:
+            return recording
+        if self.on_miss == "cycle":
+            with self._lock:
+                if kind not in self._cycles:
+                    recordings = self.store.load_all(kind)
+                    if recordings:
+                        self._cycles[kind] = itertools.cycle(recordings)
+                if kind in self._cycles:
+                    return next(self._cycles[kind])
+        raise ReplayMiss(f"No {kind} recorded for prompt in {self.store.directory}")
+
+    def _wait(self, seconds: float):
+        if self.simulate_latency:
+            sleep(seconds)
+
+    async def _await(self, seconds: float):
+        if self.simulate_latency:
+            await asyncio.sleep(seconds)
+
+    def complete(self, prompt: str) -> str:
+        recording = self._find("completion", GPT4.model_id, prompt)
+        self._wait(recording.latency_seconds)
+        return recording.response
+
+    def complete_many(self, prompts: list[str]) -> list[CompletionResult]:
+        results = []
+        latency = 0.0
+        for prompt in prompts:
+            try:
+                recording = self._find("completion", GPT4.model_id, prompt)
+            except ReplayMiss as e:
+                results.append(CompletionResult(error=e.msg))
+                continue
+            # the whole batch was one round trip, so the slowest recording stands in for it
+            latency = max(latency, recording.latency_seconds)
+            results.append(CompletionResult(text=recording.response))
+        self._wait(latency)
+        return results
+
+    async def acomplete(self, prompt: str, timeout: Optional[float] = None) -> str:
+        recording = self._find("completion", GPT4.model_id, prompt)
+        await self._await(recording.latency_seconds)
+        return recording.response
+
+    def stream_completion(self, prompt: str) -> Iterator[str]:
+        recording = self._find("completion", GPT4.model_id, prompt)
+        words = re.findall(r"\S+\s*", recording.response) or [recording.response]
+        for word in words:
+            self._wait(recording.latency_seconds / len(words))
+            yield word
+
+    def generate_image(self, prompt: str) -> bytes:
+        recording = self._find("image", SDXL.model_id, prompt)
+        self._wait(recording.latency_seconds)
+        return recording.image_bytes()
+
+    async def agenerate_image(self, prompt: str, timeout: Optional[float] = None) -> bytes:
+        recording = self._find("image", SDXL.model_id, prompt)
+        await self._await(recording.latency_seconds)
+        return recording.image_bytes()
+
+
+@st.cache_resource
+def load_backend() -> ModelBackend:
+    settings = StreamlitAppSettings.load()
+    store = RecordingStore(directory=settings.inference_recordings_dir or settings.app_data / "model-recordings")
+    match settings.inference_backend:
+        case "clarifai":
+            return ClarifaiBackend()
+        case "record":
+            return RecordingBackend(inner=ClarifaiBackend(), store=store)
+        case "replay":
+            return ReplayBackend(
+                store=store, simulate_latency=settings.replay_simulate_latency, on_miss=settings.replay_on_miss
+            )
+        case _:
+            raise ValueError(f"Unhandled model backend {settings.inference_backend=}")
+
+
+def run_async(coro: Coroutine[Any, Any, _R]) -> _R:
+    """Run a coroutine from synchronous code (e.g. a Streamlit script thread) to completion.
+
+    A fresh event loop is used per call, so the backend's grpc.aio channel is closed again before the loop goes away.
+    """
+
+    async def _runner() -> _R:
+        try:
+            return await coro
+        finally:
+            await load_backend().aclose_loop_resources()
+
+    return asyncio.run(_runner())
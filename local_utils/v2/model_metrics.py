@@ -0,0 +1,205 @@
+import math
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import perf_counter
+from typing import Iterator, Optional
+
+import streamlit as st
+
+from local_utils.v2.prompts import CHARS_PER_TOKEN, BudgetReport
+
+# name of the tool (prompts.ToolNames) or thought phase currently making model calls
+_current_tool: ContextVar[Optional[str]] = ContextVar("current_tool", default=None)
+# seconds spent waiting on the request governor during the model call being measured
+_queue_seconds: ContextVar[Optional[list[float]]] = ContextVar("queue_seconds", default=None)
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+@contextmanager
+def tool_context(tool_name: str) -> Iterator[None]:
+    """Attribute every model call made inside the block to `tool_name`."""
+    token = _current_tool.set(str(tool_name))
+    try:
+        yield
+    finally:
+        _current_tool.reset(token)
+
+
+def current_tool() -> Optional[str]:
+    return _current_tool.get()
+
+
+def note_queue_time(seconds: float):
+    """Called by the Clarifai client with the time an attempt spent queued behind the governor."""
+    if (waits := _queue_seconds.get()) is not None:
+        waits.append(seconds)
+
+
+@dataclass
+class ModelCallMetric:
+    model_id: str
+    tool: Optional[str]
+    status: str
+    wall_seconds: float
+    queue_seconds: float
+    prompt_chars: int
+    response_chars: int
+    batch_size: int = 1
+    first_token_seconds: Optional[float] = None
+    started_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return math.ceil(self.prompt_chars / CHARS_PER_TOKEN)
+
+    @property
+    def response_tokens(self) -> int:
+        return math.ceil(self.response_chars / CHARS_PER_TOKEN)
+
+
+@dataclass
+class CallMeasurement:
+    """Filled in by the caller while a model call is in progress; see MetricsRegistry.measure."""
+
+    response_chars: int = 0
+    status: str = "ok"
+    first_token_seconds: Optional[float] = None
+
+
+@dataclass
+class Histogram:
+    bounds: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+    num: int = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.num += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation (None if it is in the overflow bucket)."""
+        if not self.num:
+            return None
+        target = q * self.num
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bounds[idx] if idx < len(self.bounds) else None
+        return None
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    cached: int = 0
+    queue_seconds: float = 0.0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+
+@dataclass
+class MetricsRegistry:
+    """In-process aggregation of model call metrics, grouped by (model ID, tool)."""
+
+    recent_size: int = 200
+    _stats: dict[tuple[str, str], CallStats] = field(default_factory=dict, init=False)
+    _recent: deque = field(default_factory=deque, init=False)
+    # prompts that had to be trimmed to fit their token budget
+    _trimmed_prompts: deque = field(default_factory=deque, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def record(self, metric: ModelCallMetric):
+        with self._lock:
+            stats = self._stats.setdefault((metric.model_id, metric.tool or "-"), CallStats())
+            stats.calls += 1
+            stats.errors += metric.status == "error"
+            stats.cached += metric.status == "cached"
+            stats.queue_seconds += metric.queue_seconds
+            stats.prompt_tokens += metric.prompt_tokens
+            stats.response_tokens += metric.response_tokens
+            stats.latency.observe(metric.wall_seconds)
+            self._recent.append(metric)
+            while len(self._recent) > self.recent_size:
+                self._recent.popleft()
+
+    @contextmanager
+    def measure(self, model_id: str, prompt_chars: int, batch_size: int = 1) -> Iterator[CallMeasurement]:
+        """Time the model call made inside the block and record it, marking it as an error if the block raises."""
+        measurement = CallMeasurement()
+        waits: list[float] = []
+        token = _queue_seconds.set(waits)
+        start = perf_counter()
+        try:
+            yield measurement
+        except BaseException:
+            measurement.status = "error"
+            raise
+        finally:
+            _queue_seconds.reset(token)
+            self.record(
+                ModelCallMetric(
+                    model_id=model_id,
+                    tool=current_tool(),
+                    status=measurement.status,
+                    wall_seconds=perf_counter() - start,
+                    queue_seconds=sum(waits),
+                    prompt_chars=prompt_chars,
+                    response_chars=measurement.response_chars,
+                    batch_size=batch_size,
+                    first_token_seconds=measurement.first_token_seconds,
+                )
+            )
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            rows = []
+            for (model_id, tool), stats in sorted(self._stats.items()):
+                rows.append(
+                    {
+                        "model": model_id,
+                        "tool": tool,
+                        "calls": stats.calls,
+                        "errors": stats.errors,
+                        "cached": stats.cached,
+                        "total_seconds": round(stats.latency.total, 2),
+                        "mean_seconds": round(stats.latency.total / stats.calls, 2),
+                        "p50_seconds_le": stats.latency.quantile(0.5),
+                        "p95_seconds_le": stats.latency.quantile(0.95),
+                        "queue_seconds": round(stats.queue_seconds, 2),
+                        "prompt_tokens_est": stats.prompt_tokens,
+                        "response_tokens_est": stats.response_tokens,
+                    }
+                )
+            return rows
+
+    def recent(self) -> list[ModelCallMetric]:
+        with self._lock:
+            return list(self._recent)[::-1]
+
+    def record_budget(self, report: BudgetReport):
+        if not (report.cuts or report.over_budget):
+            return
+        with self._lock:
+            self._trimmed_prompts.append(report)
+            while len(self._trimmed_prompts) > self.recent_size:
+                self._trimmed_prompts.popleft()
+
+    def trimmed_prompts(self) -> list[BudgetReport]:
+        with self._lock:
+            return list(self._trimmed_prompts)[::-1]
+
+
+@st.cache_resource
+def load_model_metrics() -> MetricsRegistry:
+    return MetricsRegistry()
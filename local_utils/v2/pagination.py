@@ -0,0 +1,122 @@
+import base64
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Generic, Iterator, Optional, TypeVar
+
+from local_utils.v2.codec import marshall, unmarshall
+
+_T = TypeVar("_T")
+
+# key attributes DynamoDB returns in LastEvaluatedKey for a query on each index of the thoughts table
+INDEX_KEY_ATTRIBUTES = {
+    None: ("pk", "sk"),
+    "gsi1": ("pk", "sk", "gsi1pk"),
+    "gsirev": ("pk", "sk"),
+    "gsi2": ("pk", "sk", "gsi2pk", "gsi2sk"),
+    "gsi3": ("pk", "sk", "gsi3pk", "gsi3sk"),
+    "gsi4": ("pk", "sk", "gsi4pk", "gsi4sk"),
+}
+
+
+def encode_cursor(key: dict, wire_format: bool = False) -> str:
+    """Opaque, URL-safe cursor for an ExclusiveStartKey, given as plain values or already in wire format.
+
+    The cursor is the same either way, so it can be resumed by a paginator of either kind.
+    """
+    marshalled = key if wire_format else marshall(key)
+    return base64.urlsafe_b64encode(json.dumps(marshalled, sort_keys=True).encode()).decode()
+
+
+def decode_cursor(cursor: str, wire_format: bool = False) -> dict:
+    marshalled = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return marshalled if wire_format else unmarshall(marshalled)
+
+
+@dataclass
+class Page(Generic[_T]):
+    items: list[_T]
+    # pass back to resume after the last item; None once the query is exhausted
+    cursor: Optional[str]
+
+
+@dataclass
+class QueryPaginator(Generic[_T]):
+    """Runs a DynamoDB Query across every page, following LastEvaluatedKey and decoding one page at a time.
+
+    `query` is a boto3 Table.query, or with `wire_format` a client query whose items and keys are left in the
+    low-level format for `decode`; with `prefetch`, the next page is requested on a worker thread while the
+    current one is decoded and consumed.
+    """
+
+    query: Callable[..., dict]
+    query_kwargs: dict
+    decode: Callable[[dict], _T]
+    key_attributes: tuple[str, ...] = INDEX_KEY_ATTRIBUTES[None]
+    page_size: int = 100
+    prefetch: bool = False
+    wire_format: bool = False
+
+    def _query(self, start_key: Optional[dict]) -> dict:
+        kwargs = dict(self.query_kwargs, Limit=self.page_size)
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        return self.query(**kwargs)
+
+    def _responses(self, cursor: Optional[str]) -> Iterator[dict]:
+        start_key = decode_cursor(cursor, self.wire_format) if cursor else None
+        if not self.prefetch:
+            while True:
+                response = self._query(start_key)
+                yield response
+                if not (start_key := response.get("LastEvaluatedKey")):
+                    return
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-prefetch") as executor:
+            future: Optional[Future] = executor.submit(self._query, start_key)
+            while future:
+                response = future.result()
+                start_key = response.get("LastEvaluatedKey")
+                future = executor.submit(self._query, start_key) if start_key else None
+                yield response
+
+    def pages(self, cursor: Optional[str] = None) -> Iterator[Page[_T]]:
+        for response in self._responses(cursor):
+            next_key = response.get("LastEvaluatedKey")
+            yield Page(
+                items=[self.decode(x) for x in response["Items"]],
+                cursor=encode_cursor(next_key, self.wire_format) if next_key else None,
+            )
+
+    def items(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Iterator[_T]:
+        if limit is not None and limit <= 0:
+            return
+        count = 0
+        for page in self.pages(cursor):
+            for item in page.items:
+                yield item
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+    def take(self, limit: int, cursor: Optional[str] = None, max_requests: Optional[int] = None) -> Page[_T]:
+        """Up to `limit` items, with a cursor that resumes right after the last one even mid-page.
+
+        With `max_requests`, stops after that many queries even if the page is short (a filter can discard most
+        of what each query reads); the cursor then resumes after the last item read rather than the last returned.
+        """
+        items = []
+        for requests, response in enumerate(self._responses(cursor), start=1):
+            raw_items = response["Items"]
+            for idx, raw in enumerate(raw_items):
+                items.append(self.decode(raw))
+                if len(items) == limit:
+                    if idx == len(raw_items) - 1 and not response.get("LastEvaluatedKey"):
+                        return Page(items=items, cursor=None)
+                    return Page(
+                        items=items, cursor=encode_cursor({k: raw[k] for k in self.key_attributes}, self.wire_format)
+                    )
+            next_key = response.get("LastEvaluatedKey")
+            if next_key and max_requests is not None and requests >= max_requests:
+                return Page(items=items, cursor=encode_cursor(next_key, self.wire_format))
+        return Page(items=items, cursor=None)
@@ -1,7 +1,11 @@
 # ruff: noqa: E501
+import math
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Literal, Optional
+
+from logzero import logger
 
 if TYPE_CHECKING:
     from local_utils.brainv2 import PieceOfArt
@@ -9,6 +13,14 @@ if TYPE_CHECKING:
     from local_utils.v2.thoughts import PlanStep, Thought
 
 
+# rough GPT-4 token estimate for English prose; good enough for budgeting and metrics, not for billing
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
 class ToolNames(str, Enum):
     CreateArt = "CreateArt"
     WriteInJournal = "WriteInJournal"
@@ -19,6 +31,145 @@ class ToolNames(str, Enum):
     QueryForInfo = "QueryForInfo"
 
 
+# separator the brain uses when prepending newly created items to a thought's context; the oldest entries come last
+CONTEXT_SEPARATOR = "\n---\n\n"
+TRUNCATION_MARKER = "\n\n[... truncated to fit the prompt budget ...]"
+
+# estimated prompt tokens allowed per tool, leaving room in GPT-4's 8k window for the response
+PROMPT_TOKEN_BUDGETS: dict[ToolNames, int] = {
+    ToolNames.ReadLatestBlogs: 6000,
+    ToolNames.ReadFromJournal: 6000,
+    ToolNames.QueryForInfo: 6000,
+    ToolNames.WriteBlogPost: 5000,
+    ToolNames.PostOnSocial: 3000,
+}
+
+
+@dataclass
+class SectionTrim:
+    """How one template field may be shrunk when a prompt is over budget.
+
+    * oldest_first: drop context entries from the end (the oldest) and cut the oldest one kept to fill the room
+    * truncate: keep the start of the text and cut the rest
+    * fallback: swap in the `fallback` text, e.g. a shorter persona block
+
+    Trimming never takes a section below `min_tokens`, so later sections share the cut.
+    """
+
+    field: str
+    strategy: Literal["oldest_first", "truncate", "fallback"]
+    fallback: Optional[str] = None
+    min_tokens: int = 0
+
+
+@dataclass
+class SectionCut:
+    field: str
+    strategy: str
+    tokens_before: int
+    tokens_after: int
+
+
+@dataclass
+class BudgetReport:
+    tool_name: str
+    budget: int
+    tokens_before: int
+    tokens_after: int = 0
+    cuts: list[SectionCut] = field(default_factory=list)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens_after > self.budget
+
+    def format(self) -> str:
+        cuts = ", ".join(f"{x.field} {x.tokens_before}->{x.tokens_after} ({x.strategy})" for x in self.cuts)
+        return (
+            f"{self.tool_name} prompt ~{self.tokens_before} tokens, budget {self.budget},"
+            f" now ~{self.tokens_after}: {cuts or 'nothing trimmed'}"
+        )
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # prefer ending on a paragraph, then a line, then a word
+    for boundary in ("\n\n", "\n", " "):
+        idx = cut.rfind(boundary)
+        if idx > max_chars // 2:
+            cut = cut[:idx]
+            break
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def _drop_oldest(text: str, max_tokens: int) -> str:
+    segments = text.split(CONTEXT_SEPARATOR)
+    # only drop an entry whole if the newer ones alone still fill the room; a long one is cut instead
+    while len(segments) > 1 and estimate_tokens(CONTEXT_SEPARATOR.join(segments[:-1])) >= max_tokens:
+        segments.pop()
+    return _truncate(CONTEXT_SEPARATOR.join(segments), max_tokens)
+
+
+def fit_to_budget(
+    template: str, tool_name: str, values: dict[str, str], trims: list[SectionTrim]
+) -> tuple[str, BudgetReport]:
+    """Format `template`, shrinking fields in `trims` order until the prompt fits the tool's token budget."""
+    values = dict(values)
+    prompt = template.format(**values)
+    budget = PROMPT_TOKEN_BUDGETS.get(tool_name)
+    report = BudgetReport(tool_name=tool_name, budget=budget or 0, tokens_before=estimate_tokens(prompt))
+    report.tokens_after = report.tokens_before
+    if budget is None:
+        return prompt, report
+
+    for trim in trims:
+        overflow = report.tokens_after - budget
+        if overflow <= 0:
+            break
+        text = values[trim.field]
+        if not text:
+            continue
+        section_tokens = estimate_tokens(text)
+        target = max(trim.min_tokens, section_tokens - overflow)
+        match trim.strategy:
+            case "oldest_first":
+                trimmed = _drop_oldest(text, target)
+            case "truncate":
+                trimmed = _truncate(text, target)
+            case "fallback":
+                trimmed = trim.fallback if len(trim.fallback or "") < len(text) else text
+            case _:
+                raise ValueError(f"Unhandled trim strategy {trim.strategy=}")
+        if trimmed == text:
+            continue
+        values[trim.field] = trimmed
+        prompt = template.format(**values)
+        report.tokens_after = estimate_tokens(prompt)
+        report.cuts.append(SectionCut(trim.field, trim.strategy, section_tokens, estimate_tokens(trimmed)))
+
+    if report.cuts:
+        logger.warning(report.format())
+    if report.over_budget:
+        logger.warning(f"{tool_name} prompt is still over budget after trimming")
+    return prompt, report
+
+
+def _fit_and_record(template: str, tool_name: str, values: dict[str, str], trims: list[SectionTrim]) -> str:
+    """fit_to_budget for the prompt builders, keeping the report for the debug tab's prompt budget view."""
+    # imported here, model_metrics imports this module
+    from local_utils.v2.model_metrics import load_model_metrics
+
+    prompt, report = fit_to_budget(template, tool_name, values, trims)
+    load_model_metrics().record_budget(report)
+    return prompt
+
+
+def short_persona_block(persona: "Persona") -> str:
+    return f"**{persona.name}**\n- {persona.short_description}\n"
+
+
 AVAILALBLE_TOOLS = """
 ReadLatestBlogs - Returns the contents of your latest 3 blog posts, useful to ensure continuity.
 
@@ -184,14 +335,23 @@ ACTION OUTPUT BEGINS NOW:
 
 
 def summarize_for_context(thought: "Thought", persona: "Persona", current_task: "PlanStep", data: str) -> str:
-    return SUMMARIZE_FOR_CONTEXT.format(
-        persona_name=persona.name,
-        short_persona=persona.short_description,
-        task_plan=thought.it_rationale,
-        current_action=current_task.format(),
-        current_context=thought.context or "Your context is currently blank",
-        summarize_this=data,
+    prompt = _fit_and_record(
+        SUMMARIZE_FOR_CONTEXT,
+        current_task.tool_name,
+        dict(
+            persona_name=persona.name,
+            short_persona=persona.short_description,
+            task_plan=thought.it_rationale,
+            current_action=current_task.format(),
+            current_context=thought.context or "Your context is currently blank",
+            summarize_this=data,
+        ),
+        [
+            SectionTrim("current_context", "oldest_first", min_tokens=1500),
+            SectionTrim("summarize_this", "truncate", min_tokens=1000),
+        ],
     )
+    return prompt
 
 
 GENERATE_ANSWER_TO_QUESTION = """
@@ -465,16 +625,26 @@ def write_blog_entry(
     include_artwork = ""
     _ = generated_artwork
 
-    return WRITE_BLOG_ENTRY.format(
-        now=datetime.utcnow().isoformat(),
-        persona=persona.format(include_physical=True),
-        task_plan=thought.it_rationale,
-        current_action=current_task.format(),
-        current_context=thought.context,
-        blog_title=blog_title,
-        writing_style=persona.blogging_voice,
-        include_artwork=include_artwork,
+    prompt = _fit_and_record(
+        WRITE_BLOG_ENTRY,
+        current_task.tool_name,
+        dict(
+            now=datetime.utcnow().isoformat(),
+            persona=persona.format(include_physical=True),
+            task_plan=thought.it_rationale,
+            current_action=current_task.format(),
+            current_context=thought.context,
+            blog_title=blog_title,
+            writing_style=persona.blogging_voice,
+            include_artwork=include_artwork,
+        ),
+        [
+            SectionTrim("current_context", "oldest_first", min_tokens=1000),
+            # the short persona block is a last resort, once the context is as small as it may go
+            SectionTrim("persona", "fallback", fallback=short_persona_block(persona)),
+        ],
     )
+    return prompt
 
 
 POST_ON_SOCIAL = """
@@ -515,11 +685,21 @@ def post_on_social(
 ) -> str:
     _ = linked_art
 
-    return POST_ON_SOCIAL.format(
-        now=datetime.utcnow().isoformat(),
-        persona=persona.format(include_physical=True),
-        task_plan=thought.it_rationale,
-        current_action=current_task.format(),
-        current_context=thought.context,
-        writing_style=persona.blogging_voice,
+    prompt = _fit_and_record(
+        POST_ON_SOCIAL,
+        current_task.tool_name,
+        dict(
+            now=datetime.utcnow().isoformat(),
+            persona=persona.format(include_physical=True),
+            task_plan=thought.it_rationale,
+            current_action=current_task.format(),
+            current_context=thought.context,
+            writing_style=persona.blogging_voice,
+        ),
+        [
+            SectionTrim("current_context", "oldest_first", min_tokens=1000),
+            # the short persona block is a last resort, once the context is as small as it may go
+            SectionTrim("persona", "fallback", fallback=short_persona_block(persona)),
+        ],
     )
+    return prompt
@@ -0,0 +1,60 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import streamlit as st
+from logzero import logger
+
+from local_utils.settings import StreamlitAppSettings
+
+
+@dataclass
+class RenderQueue:
+    """Process-wide worker pool for image renders that run in the background of a thought.
+
+    Jobs are tracked by ID (the art's typed content ID) only until they finish; afterwards the render
+    status stored with the art is the source of truth.
+    """
+
+    max_workers: int
+    _executor: Optional[ThreadPoolExecutor] = field(default=None, init=False)
+    _jobs: dict[str, Future] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="art-render")
+        return self._executor
+
+    def submit(self, job_id: str, job: Callable[[], Any]) -> Future:
+        # run with a copy of the caller's context variables, so metrics keep their tool attribution
+        ctx = contextvars.copy_context()
+        future = self.executor.submit(ctx.run, job)
+        with self._lock:
+            self._jobs[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        logger.info(f"Queued background render {job_id}")
+        return future
+
+    def _finished(self, job_id: str, future: Future):
+        with self._lock:
+            if self._jobs.get(job_id) is future:
+                del self._jobs[job_id]
+        if future.exception():
+            logger.error(f"Background render {job_id} failed: {future.exception()!r}")
+
+    def get(self, job_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self) -> list[str]:
+        with self._lock:
+            return list(self._jobs)
+
+
+@st.cache_resource
+def load_render_queue() -> RenderQueue:
+    return RenderQueue(max_workers=StreamlitAppSettings.load().image_max_in_flight)
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+
+@dataclass
+class SqliteDatabase:
+    """A single SQLite file in WAL mode, shared by every thread through one connection per thread.
+
+    WAL lets readers carry on while a writer holds the write lock; `schema` statements are run once on creation
+    and should be idempotent (CREATE ... IF NOT EXISTS).
+    """
+
+    path: Path
+    schema: tuple[str, ...] = ()
+    timeout_seconds: float = 30
+    _local: threading.local = field(default_factory=threading.local, init=False)
+
+    def __post_init__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.transaction() as conn:
+            for statement in self.schema:
+                conn.execute(statement)
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, in autocommit mode; use `transaction` for writes."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=self.timeout_seconds, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # with WAL, NORMAL only risks the last transactions on power loss, never corruption
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
@@ -1,18 +1,26 @@
+import gzip
 import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING, Optional
+from pathlib import Path
+from time import monotonic
+from typing import TYPE_CHECKING, Iterator, Optional
 
 import boto3
 from boto3.dynamodb.conditions import Key
-from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
-from pydantic import BaseModel, Field, TypeAdapter
+from pydantic import BaseModel, Field
 
-from local_utils.helpers import date_id
+from local_utils.helpers import date_id, sortable_date
+from local_utils.v2.codec import CompressedModelCodec, compress_json, condition_kwargs, marshall, unmarshall
+from local_utils.v2.pagination import INDEX_KEY_ATTRIBUTES, QueryPaginator
+from local_utils.v2.sqlite_db import SqliteDatabase
 
 if TYPE_CHECKING:
     from mypy_boto3_dynamodb.client import DynamoDBClient
-    from mypy_boto3_dynamodb.service_resource import Table
 
 
 class PlanStep(BaseModel):
@@ -93,113 +101,462 @@ class Thought(BaseModel):
         return Thought.model_validate(kwargs)
 
 
-def unmarshall(dynamo_obj: dict) -> dict:
-    """Convert a DynamoDB dict into a standard dict."""
-    deserializer = TypeDeserializer()
-    return {k: deserializer.deserialize(v) for k, v in dynamo_obj.items()}
+class ThoughtSummary(BaseModel):
+    """What list views show about a thought, without the context, plan and responses of the full Thought."""
 
+    thought_id: str
+    version: int
+    persona_name: str
+    thought_complete: bool = False
+    user_nudge: Optional[str] = None
+    initial_thought: str
+    steps_completed: int = 0
+    total_steps: Optional[int] = None
+    generated_content_ids: set[str] = Field(default_factory=set)
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_thought(cls, thought: Thought) -> "ThoughtSummary":
+        return cls(
+            total_steps=len(thought.plan) if thought.plan else None,
+            **thought.model_dump(include=set(cls.model_fields) - {"total_steps"}),
+        )
+
+
+# every Nth version (1, 1 + N, ...) is stored in full and the rest as deltas against the version before them,
+# so reading any version reads at most N items
+SNAPSHOT_EVERY = 5
+
+
+def _string_delta(old: str, new: str) -> list:
+    """[shared prefix length, shared suffix length, replacement middle]; context grows by prepending."""
+    prefix = len(os.path.commonprefix([old, new]))
+    suffix = len(os.path.commonprefix([old[prefix:][::-1], new[prefix:][::-1]]))
+    return [prefix, suffix, new[prefix : len(new) - suffix]]
+
+
+def _apply_string_delta(old: str, delta: list) -> str:
+    prefix, suffix, middle = delta
+    return old[:prefix] + middle + old[len(old) - suffix :]
+
+
+def encode_thought_delta(previous: dict, current: dict) -> dict:
+    """Fields of `current` that differ from `previous`, with long strings as prefix/suffix edits."""
+    delta = {"set": {}, "str": {}}
+    for key, value in current.items():
+        old = previous.get(key)
+        if key in previous and old == value:
+            continue
+        if isinstance(old, str) and isinstance(value, str):
+            edit = _string_delta(old, value)
+            if len(edit[2]) < len(value):
+                delta["str"][key] = edit
+                continue
+        delta["set"][key] = value
+    return delta
+
+
+def apply_thought_delta(previous: dict, delta: dict) -> dict:
+    current = dict(previous)
+    current.update(delta["set"])
+    for key, edit in delta["str"].items():
+        current[key] = _apply_string_delta(previous[key], edit)
+    return current
+
+
+def thought_from_dynamodb_item(item: dict) -> Thought:
+    """Thought from a full item (a v0 head or a snapshot), compressed or in the original plain-attribute form."""
+    if item.get("enc") == "delta":
+        raise ValueError("Delta thought items can only be read through ThoughtMemory.read_thought")
+    if item.get("enc") == "full":
+        return Thought.model_validate_json(gzip.decompress(bytes(item["data"])))
+    return Thought(**item)
+
+
+def persona_status_key(persona_name: str, complete: bool) -> str:
+    """gsi2 partition key of a thought head, e.g. t|Ada|COMPLETE."""
+    return f"t|{persona_name}|{'COMPLETE' if complete else 'INCOMPLETE'}"
+
+
+THOUGHT_CODEC = CompressedModelCodec(Thought)
+
+
+def thought_from_wire(item: dict) -> Thought:
+    """thought_from_dynamodb_item for an item in the low-level client format."""
+    if item.get("enc") == {"S": "full"}:
+        return THOUGHT_CODEC.decode(item)
+    return thought_from_dynamodb_item(unmarshall(item))
+
+
+def thought_summary_from_wire(item: dict) -> ThoughtSummary:
+    return ThoughtSummary.model_validate(unmarshall(item))
+
+
+class ThoughtVersionConflict(ValueError):
+    """Error raised when updating a Thought from a version that is no longer the latest."""
 
-def marshall(python_obj: dict) -> dict:
-    """Convert a standard dict into a DynamoDB ."""
-    serializer = TypeSerializer()
-    return {k: serializer.serialize(v) for k, v in python_obj.items()}
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
 
 
 @dataclass
-class ThoughtMemory:
-    table_name: str
-    _dynamodb_client: Optional["DynamoDBClient"] = field(default=None, init=False)
-    _dynamodb_table: Optional["Table"] = field(default=None, init=False)
+class ThoughtReadCache:
+    """In-process cache for read_thought.
+
+    Version items (t|vN, N > 0) never change once written, so they are kept in a bounded LRU. The v0 head
+    changes with every update; it is kept for `head_ttl_seconds` and replaced whenever this process writes.
+    Cached Thoughts are copied on the way out so callers cannot modify the cached instance.
+    """
+
+    max_versions: int = 1024
+    head_ttl_seconds: float = 5.0
+    _versions: OrderedDict[tuple[str, int], Thought] = field(default_factory=OrderedDict, init=False)
+    _heads: dict[str, tuple[float, Thought]] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def get_version(self, thought_id: str, version: int) -> Optional[Thought]:
+        with self._lock:
+            thought = self._versions.get((thought_id, version))
+            if thought is None:
+                return None
+            self._versions.move_to_end((thought_id, version))
+        return thought.model_copy(deep=True)
+
+    def put_version(self, thought: Thought):
+        key = (thought.thought_id, thought.version)
+        with self._lock:
+            self._versions[key] = thought.model_copy(deep=True)
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_versions:
+                self._versions.popitem(last=False)
+
+    def get_head(self, thought_id: str) -> Optional[Thought]:
+        with self._lock:
+            cached_at, thought = self._heads.get(thought_id, (0.0, None))
+            if thought is None or monotonic() - cached_at > self.head_ttl_seconds:
+                return None
+        return thought.model_copy(deep=True)
+
+    def put_head(self, thought: Thought):
+        with self._lock:
+            self._heads[thought.thought_id] = (monotonic(), thought.model_copy(deep=True))
+            # drop expired heads rather than letting every thought ever read accumulate
+            if len(self._heads) > self.max_versions:
+                now = monotonic()
+                for thought_id in [k for k, (t, _) in self._heads.items() if now - t > self.head_ttl_seconds]:
+                    del self._heads[thought_id]
+
+    def invalidate_head(self, thought_id: str):
+        with self._lock:
+            self._heads.pop(thought_id, None)
+
+    def written(self, thought: Thought):
+        """Record a version this process just wrote, which is also the new head."""
+        self.put_version(thought)
+        self.put_head(thought)
 
-    @property
-    def dynamodb_client(self) -> "DynamoDBClient":
-        if not self._dynamodb_client:
-            self._dynamodb_client = boto3.client("dynamodb")
-        return self._dynamodb_client
 
-    @property
-    def dynamodb_table(self) -> "Table":
-        if not self._dynamodb_table:
-            dynamodb = boto3.resource("dynamodb")
-            self._dynamodb_table = dynamodb.Table(self.table_name)
-        return self._dynamodb_table
+@dataclass
+class ThoughtMemory(ABC):
+    """Versioned thought storage; every update writes a new version, conditional on the previous one being latest."""
+
+    read_cache: ThoughtReadCache = field(default_factory=ThoughtReadCache, kw_only=True)
 
     def write_new_thought(self, thought_data: NewThoughtData) -> Thought:
-        return self._save_new_thought(thought_data)
+        thought = Thought.new_from_thought_data(thought_data)
+        self._save_new_thought(thought)
+        self.read_cache.written(thought)
+        return thought
 
     def update_existing_thought(self, existing_thought: Thought, update_thought_data: UpdateThoughtData) -> Thought:
-        latest_version_of_thought = self.read_thought(thought_id=existing_thought.thought_id)
-        if existing_thought != latest_version_of_thought:
-            raise ValueError("Cannot update from old Thought version")
+        """Write the next version of the thought in a single round trip.
 
+        The write is conditional on the stored head still being at `existing_thought.version`, so updating from
+        an old version raises ThoughtVersionConflict instead of needing a read first.
+        """
         updated_thought = existing_thought.update_thought(update_thought_data)
-        self._update_existing_versioned(updated_thought, previous_version=latest_version_of_thought.version)
-        return self.read_thought(updated_thought.thought_id, updated_thought.version)
+        try:
+            self._save_next_version(updated_thought, previous=existing_thought)
+        except ThoughtVersionConflict:
+            self.read_cache.invalidate_head(updated_thought.thought_id)
+            raise
+        self.read_cache.written(updated_thought)
+        return updated_thought
 
     def read_thought(self, thought_id: str, version: int = 0) -> Thought:
-        response = self.dynamodb_table.get_item(Key={"pk": "t|" + thought_id, "sk": f"t|v{version}"})
+        if version == 0:
+            if cached := self.read_cache.get_head(thought_id):
+                return cached
+            thought = self._read_head(thought_id)
+            self.read_cache.put_head(thought)
+            self.read_cache.put_version(thought)
+            return thought
+
+        if cached := self.read_cache.get_version(thought_id, version):
+            return cached
+        thoughts = self._read_version_chain(thought_id, version)
+        for thought in thoughts:
+            self.read_cache.put_version(thought)
+        return thoughts[-1]
+
+    @abstractmethod
+    def _read_head(self, thought_id: str) -> Thought:
+        """The latest version of the thought."""
+
+    @abstractmethod
+    def _read_version_chain(self, thought_id: str, version: int) -> list[Thought]:
+        """`version` of the thought last, preceded by any earlier versions that were read along the way."""
+
+    @abstractmethod
+    def _save_new_thought(self, thought: Thought):
+        pass
+
+    @abstractmethod
+    def _save_next_version(self, thought: Thought, previous: Thought):
+        """Store `thought` as the new latest version, raising ThoughtVersionConflict unless `previous` is latest."""
+
+    @abstractmethod
+    def list_incomplete_thoughts(self) -> list[Thought]:
+        pass
+
+    @abstractmethod
+    def list_recently_completed_thoughts(self, num_results=5, persona_name: Optional[str] = None) -> list[Thought]:
+        """The most recently created complete thoughts, optionally only those of one persona."""
+
+    @abstractmethod
+    def list_recent_thoughts(self, num_results=5) -> list[Thought]:
+        pass
+
+    @abstractmethod
+    def list_incomplete_thought_summaries(self) -> list[ThoughtSummary]:
+        pass
+
+    @abstractmethod
+    def list_recently_completed_thought_summaries(
+        self, num_results=5, persona_name: Optional[str] = None
+    ) -> list[ThoughtSummary]:
+        pass
+
+    @abstractmethod
+    def iter_thought_summaries(self, complete: bool) -> Iterator[ThoughtSummary]:
+        """Every complete or incomplete thought, oldest first."""
+
+
+@dataclass
+class DynamoDbThoughtMemory(ThoughtMemory):
+    table_name: str
+    _dynamodb_client: Optional["DynamoDBClient"] = field(default=None, init=False)
+
+    @property
+    def dynamodb_client(self) -> "DynamoDBClient":
+        if not self._dynamodb_client:
+            self._dynamodb_client = boto3.client("dynamodb")
+        return self._dynamodb_client
+
+    def _read_head(self, thought_id: str) -> Thought:
+        response = self.dynamodb_client.get_item(
+            TableName=self.table_name, Key=marshall({"pk": "t|" + thought_id, "sk": "t|v0"})
+        )
         item = response.get("Item")
         if not item:
             raise ValueError("No item found with the provided key.")
-        return Thought(**item)
+        return thought_from_wire(item)
+
+    def _read_version_chain(self, thought_id: str, version: int) -> list[Thought]:
+        """Every version from the nearest full item up to `version`, reconstructed from the stored deltas."""
+        first_version = version - (version - 1) % SNAPSHOT_EVERY
+        items = self._batch_get_versions(thought_id, list(range(first_version, version + 1)))
+        if version not in items:
+            raise ValueError("No item found with the provided key.")
+        # items written before delta encoding are all full copies, so start from the latest full one
+        start = max(v for v, item in items.items() if item.get("enc") != "delta")
+        thought_data = self._item_thought_data(items[start])
+        thoughts = [Thought.model_validate(thought_data)]
+        for v in range(start + 1, version + 1):
+            thought_data = apply_thought_delta(thought_data, json.loads(gzip.decompress(bytes(items[v]["data"]))))
+            thoughts.append(Thought.model_validate(thought_data))
+        return thoughts
+
+    def _batch_get_versions(self, thought_id: str, versions: list[int]) -> dict[int, dict]:
+        keys = [marshall({"pk": "t|" + thought_id, "sk": f"t|v{v}"}) for v in versions]
+        items = {}
+        request = {self.table_name: {"Keys": keys}}
+        while request:
+            response = self.dynamodb_client.batch_get_item(RequestItems=request)
+            for raw_item in response["Responses"].get(self.table_name, []):
+                item = unmarshall(raw_item)
+                items[int(item["sk"].removeprefix("t|v"))] = item
+            request = response.get("UnprocessedKeys") or None
+        return items
+
+    @staticmethod
+    def _item_thought_data(item: dict) -> dict:
+        """JSON-compatible thought data from a full item, either compressed or a legacy plain-attribute item."""
+        if item.get("enc") == "full":
+            return json.loads(gzip.decompress(bytes(item["data"])))
+        return Thought(**item).model_dump(mode="json")
+
+    def paginate_thoughts(
+        self,
+        index: str,
+        key_condition,
+        ascending: bool = True,
+        filter_expression=None,
+        page_size: int = 100,
+        prefetch: bool = False,
+        summary_only: bool = False,
+    ) -> QueryPaginator[Thought | ThoughtSummary]:
+        """Query thought heads; with `summary_only`, only the plain summary attributes of each head are read."""
+        query_kwargs = {
+            "TableName": self.table_name,
+            "IndexName": index,
+            "ScanIndexForward": ascending,
+            **condition_kwargs(key_condition, filter_expression),
+        }
+        if summary_only:
+            # the index keys are kept so a cursor can still be built from the last item read
+            attributes = set(ThoughtSummary.model_fields) | set(INDEX_KEY_ATTRIBUTES[index])
+            names = {f"#a{idx}": name for idx, name in enumerate(sorted(attributes))}
+            query_kwargs["ProjectionExpression"] = ", ".join(names)
+            query_kwargs["ExpressionAttributeNames"].update(names)
+        return QueryPaginator(
+            query=self.dynamodb_client.query,
+            query_kwargs=query_kwargs,
+            decode=thought_summary_from_wire if summary_only else thought_from_wire,
+            key_attributes=INDEX_KEY_ATTRIBUTES[index],
+            page_size=page_size,
+            prefetch=prefetch,
+            wire_format=True,
+        )
 
     def _query_to_thoughts(
-        self, index: str, key_condition, limit: int = 25, ascending: bool = True, filter_expression=None
-    ) -> list[Thought]:
-        extra_kwargs = {}
-        if filter_expression:
-            extra_kwargs["FilterExpression"] = filter_expression
-        data = self.dynamodb_table.query(
-            IndexName=index,
-            KeyConditionExpression=key_condition,
-            Limit=limit,
-            ScanIndexForward=ascending,
-            **extra_kwargs,
+        self,
+        index: str,
+        key_condition,
+        limit: int = 25,
+        ascending: bool = True,
+        filter_expression=None,
+        summary_only: bool = False,
+    ) -> list[Thought | ThoughtSummary]:
+        paginator = self.paginate_thoughts(
+            index,
+            key_condition,
+            ascending,
+            filter_expression,
+            page_size=min(limit, 500),
+            prefetch=limit > 500,
+            summary_only=summary_only,
+        )
+        return list(paginator.items(limit))
+
+    def _query_recently_completed(
+        self, num_results: int, persona_name: Optional[str], summary_only: bool
+    ) -> list[Thought | ThoughtSummary]:
+        if persona_name:
+            index = "gsi2"
+            key_condition = Key("gsi2pk").eq(persona_status_key(persona_name, complete=True))
+        else:
+            index = "gsi1"
+            key_condition = Key("gsi1pk").eq("t|COMPLETE")
+        return self._query_to_thoughts(
+            index=index, key_condition=key_condition, ascending=False, limit=num_results, summary_only=summary_only
+        )
+
+    def iter_thought_summaries(self, complete: bool) -> Iterator[ThoughtSummary]:
+        status = "t|COMPLETE" if complete else "t|INCOMPLETE"
+        paginator = self.paginate_thoughts(
+            index="gsi1",
+            key_condition=Key("gsi1pk").eq(status),
+            ascending=True,
+            page_size=500,
+            prefetch=True,
+            summary_only=True,
         )
-        ta = TypeAdapter(list[Thought])
-        return ta.validate_python(data["Items"])
+        return paginator.items()
 
     def list_incomplete_thoughts(self) -> list[Thought]:
         return self._query_to_thoughts(
             index="gsi1", key_condition=Key("gsi1pk").eq("t|INCOMPLETE"), ascending=False, limit=100
         )
 
-    def list_recently_completed_thoughts(self, num_results=5) -> list[Thought]:
+    def list_incomplete_thought_summaries(self) -> list[ThoughtSummary]:
         return self._query_to_thoughts(
-            index="gsi1", key_condition=Key("gsi1pk").eq("t|COMPLETE"), ascending=False, limit=num_results
+            index="gsi1", key_condition=Key("gsi1pk").eq("t|INCOMPLETE"), ascending=False, limit=100, summary_only=True
         )
 
+    def list_recently_completed_thoughts(self, num_results=5, persona_name: Optional[str] = None) -> list[Thought]:
+        return self._query_recently_completed(num_results, persona_name, summary_only=False)
+
+    def list_recently_completed_thought_summaries(
+        self, num_results=5, persona_name: Optional[str] = None
+    ) -> list[ThoughtSummary]:
+        return self._query_recently_completed(num_results, persona_name, summary_only=True)
+
     def list_recent_thoughts(self, num_results=5) -> list[Thought]:
         return self._query_to_thoughts(
             index="gsirev", key_condition=Key("sk").eq("t|v0"), ascending=False, limit=num_results
         )
 
-    def _to_dynamodb_item(self, thought: Thought) -> dict:
-        output: dict = json.loads(thought.model_dump_json())
-        output.update(
-            {
-                "pk": f"t|{thought.thought_id}",
-                "sk": f"t|v{thought.version}",
-            }
-        )
-        if thought.version == 0:
-            # add in special attributes on the v0 version
-            output.update(
+    def _to_dynamodb_item(self, thought: Thought, previous: Optional[Thought] = None) -> dict:
+        """Item for one version of a thought; a delta against `previous` unless this version is a snapshot.
+
+        The thought data itself is stored gzipped in `data`, `enc` says whether it is a full copy or a delta.
+        """
+        attributes = {"pk": f"t|{thought.thought_id}", "sk": f"t|v{thought.version}", "version": thought.version}
+        if previous is None or not (thought.version - 1) % SNAPSHOT_EVERY:
+            return THOUGHT_CODEC.encode(thought, {**attributes, "enc": "full"})
+        delta = encode_thought_delta(previous.model_dump(mode="json"), thought.model_dump(mode="json"))
+        item = marshall({**attributes, "enc": "delta"})
+        item["data"] = {"B": compress_json(json.dumps(delta))}
+        return item
+
+    def _to_head_item(self, thought: Thought) -> dict:
+        """The v0 head item: a full compressed copy of the latest version, plus the index and summary attributes."""
+        attributes = {
+            # plain ThoughtSummary attributes, for list queries that project only these
+            **ThoughtSummary.from_thought(thought).model_dump(mode="json", exclude_none=True),
+            "pk": f"t|{thought.thought_id}",
+            "sk": "t|v0",
+            # the real version, which updates are conditional on
+            "version": thought.version,
+            "enc": "full",
+            "gsi1pk": "t|COMPLETE" if thought.thought_complete else "t|INCOMPLETE",
+            # kept as a plain attribute so queries can filter on it
+            "persona_name": thought.persona_name,
+            # persona + status index, newest first by creation time
+            "gsi2pk": persona_status_key(thought.persona_name, thought.thought_complete),
+            "gsi2sk": sortable_date(thought.created_at),
+        }
+        return THOUGHT_CODEC.encode(thought, attributes)
+
+    def _save_new_thought(self, thought: Thought):
+        main_item = self._to_dynamodb_item(thought)
+        v0_item = self._to_head_item(thought)
+        self.dynamodb_client.transact_write_items(
+            TransactItems=[
                 {
-                    "gsi1pk": "t|COMPLETE" if thought.thought_complete else "t|INCOMPLETE",
-                }
-            )
-        return output
+                    "Put": {
+                        "TableName": self.table_name,
+                        "Item": main_item,
+                        "ConditionExpression": "attribute_not_exists(pk) and attribute_not_exists(sk)",
+                    }
+                },
+                {
+                    "Put": {
+                        "TableName": self.table_name,
+                        "Item": v0_item,
+                        "ConditionExpression": "attribute_not_exists(pk) and attribute_not_exists(sk)",
+                    }
+                },
+            ]
+        )
 
-    def _save_new_thought(self, thought_data: NewThoughtData) -> Thought:
-        thought = Thought.new_from_thought_data(thought_data)
-        main_item = self._to_dynamodb_item(thought)
-        # copy the resource, set version to zero, and generate the db item again
-        v0_resource = thought.model_copy()
-        v0_resource.version = 0
-        v0_item = self._to_dynamodb_item(v0_resource)
-        # restore the version in the final item, so we only have the 0 version in the item keys
-        v0_item["version"] = main_item["version"]
+    def _save_next_version(self, thought: Thought, previous: Thought):
+        previous_version = previous.version
+        main_item = self._to_dynamodb_item(thought, previous=previous)
+        v0_item = self._to_head_item(thought)
 
         try:
             self.dynamodb_client.transact_write_items(
@@ -207,50 +564,203 @@ class ThoughtMemory:
                     {
                         "Put": {
                             "TableName": self.table_name,
-                            "Item": marshall(main_item),
+                            "Item": main_item,
                             "ConditionExpression": "attribute_not_exists(pk) and attribute_not_exists(sk)",
                         }
                     },
                     {
                         "Put": {
                             "TableName": self.table_name,
-                            "Item": marshall(v0_item),
-                            "ConditionExpression": "attribute_not_exists(pk) and attribute_not_exists(sk)",
+                            "Item": v0_item,
+                            "ConditionExpression": (
+                                "attribute_exists(pk) and attribute_exists(sk) and #version = :version"
+                            ),
+                            "ExpressionAttributeNames": {"#version": "version"},
+                            "ExpressionAttributeValues": marshall({":version": previous_version}),
                         }
                     },
                 ]
             )
-        except Exception as e:
-            print(e)
-        return self.read_thought(thought.thought_id, thought.version)
+        except self.dynamodb_client.exceptions.TransactionCanceledException as e:
+            reasons = [x.get("Code") for x in e.response.get("CancellationReasons", [])]
+            if "ConditionalCheckFailed" in reasons:
+                raise ThoughtVersionConflict(
+                    f"Thought {thought.thought_id} is no longer at version {previous_version}"
+                ) from e
+            raise
+
+    def backfill_thought_heads(self) -> int:
+        """Rewrite heads not in the current format (gsi2 keys, summary attributes); returns heads updated.
+
+        Each head is rewritten in the current format, conditional on it not having been updated in the meantime.
+        """
+        paginator = QueryPaginator(
+            query=self.dynamodb_client.query,
+            query_kwargs={
+                "TableName": self.table_name,
+                "IndexName": "gsirev",
+                **condition_kwargs(Key("sk").eq("t|v0")),
+            },
+            decode=lambda item: item,
+            key_attributes=INDEX_KEY_ATTRIBUTES["gsirev"],
+            page_size=500,
+            wire_format=True,
+        )
+        updated = 0
+        for item in paginator.items():
+            thought = thought_from_wire(item)
+            head_item = self._to_head_item(thought)
+            # gsi2sk was once written with isoformat, which is not fixed width
+            if "initial_thought" in item and item.get("gsi2sk") == head_item["gsi2sk"]:
+                continue
+            try:
+                self.dynamodb_client.put_item(
+                    TableName=self.table_name,
+                    Item=head_item,
+                    ConditionExpression="#version = :version",
+                    ExpressionAttributeNames={"#version": "version"},
+                    ExpressionAttributeValues=marshall({":version": thought.version}),
+                )
+            except self.dynamodb_client.exceptions.ConditionalCheckFailedException:
+                # updated since it was read, so it was written in the current format
+                continue
+            updated += 1
+        return updated
+
+
+THOUGHTS_SQLITE_SCHEMA = (
+    # the latest version of every thought, the equivalent of the v0 head items
+    "CREATE TABLE IF NOT EXISTS thoughts (thought_id TEXT PRIMARY KEY, version INTEGER NOT NULL,"
+    " persona_name TEXT NOT NULL, thought_complete INTEGER NOT NULL, created_at TEXT NOT NULL, summary TEXT NOT NULL,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS thoughts_by_date ON thoughts (created_at)",
+    "CREATE INDEX IF NOT EXISTS thoughts_by_status ON thoughts (thought_complete, created_at)",
+    "CREATE INDEX IF NOT EXISTS thoughts_by_persona ON thoughts (persona_name, thought_complete, created_at)",
+    "CREATE TABLE IF NOT EXISTS thought_versions (thought_id TEXT NOT NULL, version INTEGER NOT NULL,"
+    " data TEXT NOT NULL, PRIMARY KEY (thought_id, version)) WITHOUT ROWID",
+)
 
-    def _update_existing_versioned(self, thought: Thought, previous_version: int):
-        main_item = self._to_dynamodb_item(thought)
 
-        # copy the resource, set version to zero, and generate the db item again
-        v0_resource = thought.model_copy()
-        v0_resource.version = 0
-        v0_item = self._to_dynamodb_item(v0_resource)
-        # restore the version in the final item, so we only have the 0 version in the item keys
-        v0_item["version"] = main_item["version"]
+@dataclass
+class SqliteThoughtMemory(ThoughtMemory):
+    """Thoughts in a local SQLite file, for single node deployments and benchmark runs.
 
-        self.dynamodb_client.transact_write_items(
-            TransactItems=[
-                {
-                    "Put": {
-                        "TableName": self.table_name,
-                        "Item": marshall(main_item),
-                        "ConditionExpression": "attribute_not_exists(pk) and attribute_not_exists(sk)",
-                    }
-                },
-                {
-                    "Put": {
-                        "TableName": self.table_name,
-                        "Item": marshall(v0_item),
-                        "ConditionExpression": "attribute_exists(pk) and attribute_exists(sk) and #version = :version",
-                        "ExpressionAttributeNames": {"#version": "version"},
-                        "ExpressionAttributeValues": marshall({":version": previous_version}),
-                    }
-                },
-            ]
+    Every version is stored as a full JSON copy; local writes are cheap, so the delta encoding used for DynamoDB
+    would only slow down reads of old versions.
+    """
+
+    path: Path
+    _db: Optional[SqliteDatabase] = field(default=None, init=False)
+
+    @property
+    def db(self) -> SqliteDatabase:
+        if not self._db:
+            self._db = SqliteDatabase(path=self.path, schema=THOUGHTS_SQLITE_SCHEMA)
+        return self._db
+
+    def _read_head(self, thought_id: str) -> Thought:
+        row = self.db.connection().execute("SELECT data FROM thoughts WHERE thought_id = ?", (thought_id,)).fetchone()
+        if not row:
+            raise ValueError("No item found with the provided key.")
+        return Thought.model_validate_json(row[0])
+
+    def _read_version_chain(self, thought_id: str, version: int) -> list[Thought]:
+        row = (
+            self.db.connection()
+            .execute("SELECT data FROM thought_versions WHERE thought_id = ? AND version = ?", (thought_id, version))
+            .fetchone()
         )
+        if not row:
+            raise ValueError("No item found with the provided key.")
+        return [Thought.model_validate_json(row[0])]
+
+    def _save_new_thought(self, thought: Thought):
+        data = thought.model_dump_json()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO thoughts (thought_id, version, persona_name, thought_complete, created_at, summary, data)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thought.thought_id,
+                    thought.version,
+                    thought.persona_name,
+                    thought.thought_complete,
+                    sortable_date(thought.created_at),
+                    ThoughtSummary.from_thought(thought).model_dump_json(),
+                    data,
+                ),
+            )
+            conn.execute(
+                "INSERT INTO thought_versions (thought_id, version, data) VALUES (?, ?, ?)",
+                (thought.thought_id, thought.version, data),
+            )
+
+    def _save_next_version(self, thought: Thought, previous: Thought):
+        data = thought.model_dump_json()
+        with self.db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE thoughts SET version = ?, thought_complete = ?, summary = ?, data = ?"
+                " WHERE thought_id = ? AND version = ?",
+                (
+                    thought.version,
+                    thought.thought_complete,
+                    ThoughtSummary.from_thought(thought).model_dump_json(),
+                    data,
+                    thought.thought_id,
+                    previous.version,
+                ),
+            )
+            if cursor.rowcount != 1:
+                raise ThoughtVersionConflict(f"Thought {thought.thought_id} is no longer at version {previous.version}")
+            conn.execute(
+                "INSERT INTO thought_versions (thought_id, version, data) VALUES (?, ?, ?)",
+                (thought.thought_id, thought.version, data),
+            )
+
+    def _select_thoughts(
+        self,
+        where: str = "",
+        params: tuple = (),
+        ascending: bool = False,
+        limit: int = -1,
+        summary_only: bool = False,
+    ) -> list[Thought | ThoughtSummary]:
+        where = f"WHERE {where} " if where else ""
+        order = "ASC" if ascending else "DESC"
+        column, model = ("summary", ThoughtSummary) if summary_only else ("data", Thought)
+        rows = self.db.connection().execute(
+            f"SELECT {column} FROM thoughts {where}ORDER BY created_at {order} LIMIT ?", (*params, limit)
+        )
+        return [model.model_validate_json(value) for (value,) in rows]
+
+    def _select_recently_completed(
+        self, num_results: int, persona_name: Optional[str], summary_only: bool
+    ) -> list[Thought | ThoughtSummary]:
+        if persona_name:
+            return self._select_thoughts(
+                "persona_name = ? AND thought_complete = 1",
+                (persona_name,),
+                limit=num_results,
+                summary_only=summary_only,
+            )
+        return self._select_thoughts("thought_complete = 1", limit=num_results, summary_only=summary_only)
+
+    def list_incomplete_thoughts(self) -> list[Thought]:
+        return self._select_thoughts("thought_complete = 0", limit=100)
+
+    def list_incomplete_thought_summaries(self) -> list[ThoughtSummary]:
+        return self._select_thoughts("thought_complete = 0", limit=100, summary_only=True)
+
+    def list_recently_completed_thoughts(self, num_results=5, persona_name: Optional[str] = None) -> list[Thought]:
+        return self._select_recently_completed(num_results, persona_name, summary_only=False)
+
+    def list_recently_completed_thought_summaries(
+        self, num_results=5, persona_name: Optional[str] = None
+    ) -> list[ThoughtSummary]:
+        return self._select_recently_completed(num_results, persona_name, summary_only=True)
+
+    def list_recent_thoughts(self, num_results=5) -> list[Thought]:
+        return self._select_thoughts(limit=num_results)
+
+    def iter_thought_summaries(self, complete: bool) -> Iterator[ThoughtSummary]:
+        return iter(self._select_thoughts("thought_complete = ?", (complete,), ascending=True, summary_only=True))
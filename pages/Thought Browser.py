@@ -3,13 +3,12 @@ from datetime import datetime
 
 import pandas as pd
 import streamlit as st
-from boto3.dynamodb.conditions import Key
 from pydantic import Field
 
 from local_utils import ui_lib as ui
-from local_utils.brainv2 import PieceOfArt
+from local_utils.brainv2 import ArtSize, PieceOfArt
 from local_utils.session_data import BaseSessionData
-from local_utils.v2.thoughts import Thought
+from local_utils.v2.thoughts import ThoughtSummary
 
 st.set_page_config("Thought Browser", initial_sidebar_state="collapsed", layout="wide")
 
@@ -19,26 +18,15 @@ class SessionData(BaseSessionData):
 
 
 @st.cache_resource
-def get_all_thoughts(_brain) -> list[Thought]:
-    complete_thoughts = _brain.thought_memory._query_to_thoughts(
-        index="gsi1",
-        key_condition=Key("gsi1pk").eq("t|COMPLETE"),
-        # filter_expression=Attr("persona_name").eq(persona_name),
-        ascending=True,
-        limit=5000,
-    )
-    incomplete_thoughts = _brain.thought_memory._query_to_thoughts(
-        index="gsi1",
-        key_condition=Key("gsi1pk").eq("t|INCOMPLETE"),
-        # filter_expression=Attr("persona_name").eq(persona_name),
-        ascending=True,
-        limit=5000,
-    )
-    return sorted(complete_thoughts + incomplete_thoughts, key=lambda x: x.created_at)
+def get_all_thoughts(_brain) -> list[ThoughtSummary]:
+    thoughts = []
+    for complete in (True, False):
+        thoughts.extend(_brain.thought_memory.iter_thought_summaries(complete))
+    return sorted(thoughts, key=lambda x: x.created_at)
 
 
 @st.cache_resource
-def thoughts_for_persona(_brain, persona_name: str) -> list[Thought]:
+def thoughts_for_persona(_brain, persona_name: str) -> list[ThoughtSummary]:
     return [x for x in get_all_thoughts(_brain) if x.persona_name == persona_name]
 
 
@@ -90,9 +78,9 @@ def main(session: SessionData):
                 if thought.thought_complete:
                     st.info("This thought completed " + thought.updated_at.isoformat())
                 else:
-                    if thought.plan:
+                    if thought.total_steps:
                         st.warning(
-                            f"This thought is incomplete; on step {thought.steps_completed +1} of {len(thought.plan)}"
+                            f"This thought is incomplete; on step {thought.steps_completed +1} of {thought.total_steps}"
                         )
                     else:
                         st.warning("This thought is incomplete; no plan developed")
@@ -103,9 +91,6 @@ def main(session: SessionData):
                 if thought.user_nudge:
                     st.caption(f'Thought was "nudged"\n> "{thought.user_nudge}"')
 
-            with st.expander("Thought rationale"):
-                st.write(thought.it_rationale)
-
             if st.toggle("View Full Thought Object", key=f"versions-for-{thought.thought_id}", value=False):
                 num_versions = thought.version
 
@@ -119,10 +104,10 @@ def main(session: SessionData):
                         key=f"view-version-for-{thought.thought_id}",
                     )
 
-                if version == num_versions:
-                    thought_obj = thought
-                else:
-                    thought_obj = brain.thought_memory.read_thought(thought.thought_id, version)
+                # the list only holds summaries, the full thought is read when asked for
+                thought_obj = brain.thought_memory.read_thought(thought.thought_id, version)
+                with st.expander("Thought rationale"):
+                    st.write(thought_obj.it_rationale)
 
                 df = pd.DataFrame(
                     [
@@ -166,7 +151,10 @@ def main(session: SessionData):
                     art = next(x for x in created_art if x.get_content_id() == art_id)
                     # st.write(art)
                     with art_col:
-                        st.image(brain.output_memory.get_art_content_location(art))
+                        if art.is_rendered:
+                            st.image(brain.output_memory.get_art_content_location(art, ArtSize.Thumbnail))
+                        else:
+                            st.caption(f"{art.title}: artwork {art.render_status.value}")
 
             st.divider()
 
@@ -14,11 +14,14 @@ from wordcloud import STOPWORDS, WordCloud
 from local_utils import ui_lib as ui
 from local_utils.brainv2 import (
     ActionCallback,
+    ActionDelta,
+    ArtSize,
     ArtworkDoesNotExist,
     BlogEntry,
     BrainV2,
     JournalEntry,
     PieceOfArt,
+    RenderStatus,
     SocialPost,
 )
 from local_utils.session_data import BaseSessionData
@@ -39,6 +42,9 @@ class SessionData(BaseSessionData):
     thought_id: Optional[str] = None
     thought: Optional[Thought] = None
     last_full_response: Optional[str] = None
+    # cursors of the gallery pages scrolled past, the last one resumes the current page
+    feed_cursors: list[str] = Field(default_factory=list)
+    feed_filter: Optional[str] = None
 
 
 def render_intro():
@@ -149,7 +155,7 @@ def main(session: SessionData):
                     render_active_thought(brain, session)
 
         with ai_output_tab:
-            render_ai_output(brain)
+            render_ai_output(brain, session)
 
         with thoughts_tab:
             render_recent_thoughts(brain)
@@ -223,12 +229,14 @@ def render_active_thought(brain: BrainV2, session: SessionData):
                     key=lambda x: x.split(":", maxsplit=1)[1],
                 )
                 st.subheader("Content Produced")
-                for this_id in ids:
-                    content = brain.output_memory.read_content_with_type(this_id)
+                for content in brain.output_memory.read_contents_with_type(ids):
                     with st.expander(content.get_label()):
                         st.write(content.format())
                         if isinstance(content, PieceOfArt):
-                            st.image(brain.output_memory.get_art_content_location(content))
+                            if content.is_rendered:
+                                st.image(brain.output_memory.get_art_content_location(content, ArtSize.Medium))
+                            else:
+                                st.caption(f"Artwork {content.render_status.value}")
 
     with chat_col:
         steps_completed = thought.steps_completed
@@ -313,7 +321,17 @@ def render_active_thought(brain: BrainV2, session: SessionData):
         with continue_thought_placeholder:
             status = st.status(current_task, expanded=True)
 
-            def _callback(data: ActionCallback):
+            streamed = {"status": None, "text": ""}
+
+            def _callback(data: ActionCallback | ActionDelta):
+                if isinstance(data, ActionDelta):
+                    if data.status != streamed["status"]:
+                        # a new completion started streaming; the placeholder only shows the latest one
+                        streamed.update(status=data.status, text="")
+                        status.update(label=f"{current_task}: {data.status}", expanded=True)
+                    streamed["text"] += data.delta
+                    stream_placeholder.markdown(streamed["text"])
+                    return
                 if data.status:
                     status.update(label=f"{current_task}: {data.status}")
                 if data.details:
@@ -321,6 +339,7 @@ def render_active_thought(brain: BrainV2, session: SessionData):
                     status.write(data.details)
 
             with status:
+                stream_placeholder = st.empty()
                 _, full_response = brain.continue_thought(thought, _callback)
                 st.info("Action complete!")
 
@@ -381,13 +400,10 @@ def render_load_prior_thought_selection(brain: BrainV2, persona: Persona, sessio
         session.thought_id = thought_id
 
     display_header = True
-    persona_name = persona.name
-    recent = [x for x in ui.list_recent_thoughts() if x.persona_name == persona_name]
+    recent = ui.list_recent_thoughts(persona_name=persona.name)
 
     if recent:
         for data in recent:
-            if data.persona_name != persona_name:
-                continue
             display_data = data.model_dump(include={"thought_id", "descr", "version"})
             display_data["done"] = ui.check_or_x(data.thought_complete)
             columns = iter(st.columns(len(display_data) + 1))
@@ -406,33 +422,29 @@ def render_load_prior_thought_selection(brain: BrainV2, persona: Persona, sessio
         st.write("*No recent thoughts*")
 
 
-def render_ai_output(brain: BrainV2):
+def render_ai_output(brain: BrainV2, session: SessionData):
     media_types = st.multiselect("Filter Media Types", ("Art", "Journal Entries", "Social Posts", "Blog Posts"))
     persona_name = st.selectbox("Filter Persona", [""] + brain.personas.list_persona_names()) or None
 
-    if not media_types:
-        get_art = True
-        get_journal = True
-        get_blog = True
-        get_social = True
-    else:
-        get_art = "Art" in media_types
-        get_journal = "Journal Entries" in media_types
-        get_blog = "Blog Posts" in media_types
-        get_social = "Social Posts" in media_types
-
-    output_entries = []
-    if get_art:
-        output_entries.extend(brain.output_memory.get_latest_art_pieces(persona_name, num=10))
-    if get_journal:
-        output_entries.extend(brain.output_memory.get_latest_journal_entries(persona_name, num=10))
-    if get_blog:
-        output_entries.extend(brain.output_memory.get_latest_blog_entries(persona_name, num=10))
-    if get_social:
-        output_entries.extend(brain.output_memory.get_latest_social_posts(persona_name, num=10))
-
-    sorted_entries = sorted(output_entries, key=lambda x: x.date_added, reverse=True)
-    for idx, entry in enumerate(sorted_entries):
+    feed_types = {
+        "Art": PieceOfArt,
+        "Journal Entries": JournalEntry,
+        "Social Posts": SocialPost,
+        "Blog Posts": BlogEntry,
+    }
+    # start from the newest page whenever the filters change
+    feed_filter = f"{sorted(media_types)}|{persona_name}"
+    if session.feed_filter != feed_filter:
+        session.feed_filter = feed_filter
+        session.feed_cursors = []
+
+    page = brain.output_memory.get_feed(
+        persona_name,
+        types=[feed_types[x] for x in media_types] or None,
+        cursor=session.feed_cursors[-1] if session.feed_cursors else None,
+        page_size=10,
+    )
+    for idx, entry in enumerate(page.items):
         match entry:
             case JournalEntry():
                 render_ai_output_journal(brain, entry)
@@ -459,6 +471,14 @@ def render_ai_output(brain: BrainV2):
             st.experimental_rerun()
         st.divider()
 
+    c1, c2 = st.columns(2)
+    if session.feed_cursors and c1.button("Newer", key="gallery-newer"):
+        session.feed_cursors.pop()
+        st.experimental_rerun()
+    if page.cursor and c2.button("Older", key="gallery-older"):
+        session.feed_cursors.append(page.cursor)
+        st.experimental_rerun()
+
 
 def render_ai_output_blog(brain: BrainV2, entry: BlogEntry):
     persona = brain.personas.get_persona_by_name(entry.persona_name)
@@ -477,29 +497,33 @@ def render_ai_output_blog(brain: BrainV2, entry: BlogEntry):
             chunks = split_on_images(entry.content)
             for idx, chunk in enumerate(chunks):
                 st.write(chunk)
-                if entry.generated_art and idx + 1 <= len(entry.generated_art):
-                    st.image(brain.output_memory.get_art_content_location(entry.generated_art[idx]))
+                if entry.generated_art and idx + 1 <= len(entry.generated_art) and entry.generated_art[idx].is_rendered:
+                    st.image(brain.output_memory.get_art_content_location(entry.generated_art[idx], ArtSize.Medium))
 
             # output any remaining images
             if entry.generated_art and idx + 1 < len(entry.generated_art):
                 for art in entry.generated_art[idx + 1 :]:
-                    st.image(brain.output_memory.get_art_content_location(art))
+                    if art.is_rendered:
+                        st.image(brain.output_memory.get_art_content_location(art, ArtSize.Medium))
             # st.write(entry.format())
 
 
 def render_ai_output_art(brain: BrainV2, art: PieceOfArt):
     persona = brain.personas.get_persona_by_name(art.persona_name)
-    try:
-        art_contents = brain.output_memory.get_art_content_location(art)
-    except ArtworkDoesNotExist:
-        art_contents = None
+    thumbnail = art_contents = None
+    if art.is_rendered:
+        try:
+            thumbnail = brain.output_memory.get_art_content_location(art, ArtSize.Thumbnail)
+            art_contents = brain.output_memory.get_art_content_location(art, ArtSize.Medium)
+        except ArtworkDoesNotExist:
+            pass
 
     with st.chat_message("ai", avatar=str(persona.avatar)):
         st.write(f"**{persona.name} generated new art!**")
         date_as_pacific = art.date_added.replace(tzinfo=tzutc()).astimezone(ZoneInfo("US/Pacific"))
         st.write(date_as_pacific.strftime("%d %b %Y %l:%M %p"))
-        if art_contents:
-            st.image(art_contents, width=150)
+        if thumbnail:
+            st.image(thumbnail, width=150)
 
     with st.expander(f"View generated art: **{art.title}**"):
         c1, c2 = st.columns((1, 2))
@@ -510,6 +534,8 @@ def render_ai_output_art(brain: BrainV2, art: PieceOfArt):
             st.write(f"**{art.title}**")
             if art_contents:
                 st.image(art_contents)
+            elif art.render_status == RenderStatus.Failed:
+                st.write("Artwork rendering failed")
             else:
                 st.write("Artwork not yet rendered")
 
@@ -531,8 +557,8 @@ def render_ai_output_social(brain: BrainV2, entry: SocialPost):
         date_as_pacific = entry.date_added.replace(tzinfo=tzutc()).astimezone(ZoneInfo("US/Pacific"))
         st.write(date_as_pacific.strftime("%d %b %Y %l:%M %p"))
     st.write(entry.content)
-    if entry.generated_art:
-        st.image(brain.output_memory.get_art_content_location(entry.generated_art))
+    if entry.generated_art and entry.generated_art.is_rendered:
+        st.image(brain.output_memory.get_art_content_location(entry.generated_art, ArtSize.Medium))
 
 
 def render_recent_thoughts(brain: BrainV2):
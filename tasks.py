@@ -33,7 +33,17 @@ def create_thoughts_table(c, name="thoughts-table", delete_first=False):
         print("Sleeping 5 seconds to wait for deletion")
         sleep(5)
 
-    attributes = {"pk": "S", "sk": "S", "gsi1pk": "S"}
+    attributes = {
+        "pk": "S",
+        "sk": "S",
+        "gsi1pk": "S",
+        "gsi2pk": "S",
+        "gsi2sk": "S",
+        "gsi3pk": "S",
+        "gsi3sk": "S",
+        "gsi4pk": "S",
+        "gsi4sk": "S",
+    }
     # AttributeName=pk,AttributeType=S AttributeName=sk,AttributeType=S
     attribute_def = " ".join(f"AttributeName={k},AttributeType={v}" for k, v in attributes.items())
 
@@ -51,6 +61,33 @@ def create_thoughts_table(c, name="thoughts-table", delete_first=False):
             "KeySchema": [{"AttributeName": "gsi1pk", "KeyType": "HASH"}, {"AttributeName": "pk", "KeyType": "RANGE"}],
             "Projection": {"ProjectionType": "ALL"},
         },
+        # gsi2 queries a persona's thoughts by status, newest first; sparsely populated on v0 thought objects
+        {
+            "IndexName": "gsi2",
+            "KeySchema": [
+                {"AttributeName": "gsi2pk", "KeyType": "HASH"},
+                {"AttributeName": "gsi2sk", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+        # gsi3 is the content feed: every piece of AI content in one partition, ordered by date added
+        {
+            "IndexName": "gsi3",
+            "KeySchema": [
+                {"AttributeName": "gsi3pk", "KeyType": "HASH"},
+                {"AttributeName": "gsi3sk", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+        # gsi4 is each persona's content feed, ordered by date added
+        {
+            "IndexName": "gsi4",
+            "KeySchema": [
+                {"AttributeName": "gsi4pk", "KeyType": "HASH"},
+                {"AttributeName": "gsi4sk", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
     ]
     index_json = json.dumps(global_indexes)
 
@@ -71,6 +108,69 @@ def run_streamlit(c):
         )
 
 
+@task
+def bench_clarifai_channel(c, calls=5):
+    with Paths.cd(c, Paths.repo_root):
+        c.run(f"python -m benchmarks.clarifai_channel --calls {calls}", pty=True)
+
+
+@task
+def bench_dynamodb_codec(c, iterations=2000):
+    with Paths.cd(c, Paths.repo_root):
+        c.run(f"python -m benchmarks.dynamodb_codec --iterations {iterations}", pty=True)
+
+
+@task
+def backfill_art_derivatives(c, overwrite=False):
+    """Create the thumbnail / medium WebP derivatives for art stored before they were generated on write."""
+    from local_utils.ui_lib import setup_output_memory
+
+    written = setup_output_memory().backfill_art_derivatives(overwrite=overwrite)
+    print(f"Wrote {written} art derivatives")
+
+
+@task
+def backfill_art_cache_headers(c, overwrite=False):
+    """Set Content-Type and an immutable Cache-Control on art objects uploaded without them."""
+    from local_utils.brainv2 import S3ArtContents
+    from local_utils.ui_lib import setup_output_memory
+
+    output_memory = setup_output_memory()
+    if not isinstance(output_memory, S3ArtContents):
+        print("Only S3 art storage has cache headers to backfill")
+        return
+    updated = output_memory.backfill_cache_headers(overwrite=overwrite)
+    print(f"Updated headers on {updated} art objects")
+
+
+@task
+def backfill_thought_heads(c):
+    """Rewrite thought heads written before the current gsi2 keys and summary attributes."""
+    from local_utils.ui_lib import setup_thought_memory
+    from local_utils.v2.thoughts import DynamoDbThoughtMemory
+
+    thought_memory = setup_thought_memory()
+    if not isinstance(thought_memory, DynamoDbThoughtMemory):
+        print("Only DynamoDB thought memory has thought heads to backfill")
+        return
+    updated = thought_memory.backfill_thought_heads()
+    print(f"Updated {updated} thoughts")
+
+
+@task
+def backfill_content_feed_index(c):
+    """Add the gsi3 and gsi4 feed attributes to AI content written before those indexes existed."""
+    from local_utils.brainv2 import DynamoDbMemoryEntries
+    from local_utils.ui_lib import setup_output_memory
+
+    output_memory = setup_output_memory()
+    if not isinstance(output_memory, DynamoDbMemoryEntries):
+        print("Only DynamoDB output memory has a feed index to backfill")
+        return
+    updated = output_memory.backfill_feed_index()
+    print(f"Updated {updated} content items")
+
+
 @task
 def lint(c: Context):
     with Paths.cd(c, Paths.repo_root):